@@ -1,5 +1,6 @@
 import asyncio
 import argparse
+import logging
 from typing import Tuple
 import treys
 
@@ -10,6 +11,8 @@ from time import sleep
 from cards import Deck, Cards
 from game import Player
 from eval_deep_multi import eval
+from equity_session import EquitySession
+import equity_store
 
 parser = argparse.ArgumentParser(
     prog='Template bot',
@@ -19,6 +22,8 @@ parser.add_argument('--room', type=str, default='my-new-room',
                     help='The room to connect to')
 parser.add_argument('--username', type=str, default='bot',
                     help='The username for this bot (make sure it\'s unique)')
+parser.add_argument('--confidence', type=float, default=0.99,
+                    help='Confidence at which the equity band of a decision is settled, 1 to only settle it for sure')
 
 args = parser.parse_args()
 
@@ -239,7 +244,9 @@ class TemplateBot(Bot):
     def game_over(self, payouts):
         # global cnt
         print('game over', payouts)
+        equity_store.log_stats()
         self.preflop_strategy = []
+        self.session = None
         # cnt += 1
         # print(cnt)
         pass
@@ -247,6 +254,7 @@ class TemplateBot(Bot):
     def start_game(self, my_id):
         self.my_id = my_id
         self.preflop_strategy = []
+        self.session = None
         pass
 
 
@@ -298,6 +306,31 @@ class TemplateBot(Bot):
             return 0
 
 
+    def equity_session(self, hand, board):
+        '''Equity session of the hand, started on the flop and kept for the turn and river'''
+        hand_ids, flop_ids = [card.id for card in hand], [card.id for card in board[:3]]
+        if self.session is None or self.session.hand != hand_ids or self.session.flop != flop_ids:
+            self.session = EquitySession(hand_ids, flop_ids)
+        return self.session
+
+    def thresholds(self, state):
+        '''Values of the hand strength at which act changes its decision'''
+        me = [p for p in state.players if p.id == args.username][0]
+        raise_amount = state.target_bet - me.current_bet
+        call = min(raise_amount / (state.pot + raise_amount) * state.pot / 1500, 0.9)
+        return sorted({0.25, 0.45, 0.65, 0.75, 0.85 + state.pot / 2000 * 0.1, call})
+
+    def banded_strength(self, e, state):
+        '''Potential hand strength as far as it takes to tell which decision it leads to. With the session of the hand
+        it is exact, from one enumeration of the flop for the flop and the turn; without one, an estimate stops once
+        the band is settled. If it is not, the estimate decides as it is.'''
+        result = e.band(self.thresholds(state), args.confidence if args.confidence < 1 else None)
+        if result['band'] is None:
+            print("band not settled, bounds", result['bounds'], "from", result['samples'], "pairs")
+        else:
+            print("band", result['band_limits'], "bounds", result['bounds'], "from", result['samples'], "pairs")
+        return result['equity']
+
     def p_hand_eval(self, state, hand):
         
         # print(state.cards)
@@ -309,17 +342,17 @@ class TemplateBot(Bot):
         elif len(state.cards) == 3:
             hand = [d.get(str(card_name(str(hand[0].rank)))+short_suit(hand[0].suit)), d.get(str(card_name(str(hand[1].rank)))+short_suit(hand[1].suit))]
             board = [d.get(str(card_name(str(state.cards[0].rank)))+short_suit(state.cards[0].suit)), d.get(str(card_name(str(state.cards[1].rank)))+short_suit(state.cards[1].suit)), d.get(str(card_name(str(state.cards[2].rank)))+short_suit(state.cards[2].suit))]
-            e = eval(hand, board)
+            e = eval(hand, board, session=self.equity_session(hand, board))
             print("3 potential strength: ")
-            h = e.potential_hand_strength(2)
+            h = self.banded_strength(e, state)
             print(h)
             return h
         elif len(state.cards) == 4:
             hand = [d.get(str(card_name(str(hand[0].rank)))+short_suit(hand[0].suit)), d.get(str(card_name(str(hand[1].rank)))+short_suit(hand[1].suit))]
             board = [d.get(str(card_name(str(state.cards[0].rank)))+short_suit(state.cards[0].suit)), d.get(str(card_name(str(state.cards[1].rank)))+short_suit(state.cards[1].suit)), d.get(str(card_name(str(state.cards[2].rank)))+short_suit(state.cards[2].suit)), d.get(str(card_name(str(state.cards[3].rank)))+short_suit(state.cards[3].suit))]
-            e = eval(hand, board)
+            e = eval(hand, board, session=self.equity_session(hand, board))
             print("4 potential strength: ")
-            h = e.potential_hand_strength(1)
+            h = self.banded_strength(e, state)
             print(h)
             return h
         elif len(state.cards) == 5:
@@ -457,5 +490,6 @@ class TemplateBot(Bot):
         
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     bot = TemplateBot("ws.turingpoker.com", "80", args.room+"-timeout=10000-minPlayers=2-maxRounds=1000-defaultStack=5000-bigBlind=10-smallBlind=5", args.username)
     asyncio.run(bot.start())
\ No newline at end of file
@@ -0,0 +1,127 @@
+'''NumPy counterpart of evaluator.rank, for whole arrays of hands at once.
+
+The lookups are the same as in evaluator.py, done with array indexing on the same tables. When the tables are
+memory-mapped, the arrays below are views of the mapping and nothing is copied.'''
+from itertools import combinations
+
+import numpy as np
+
+import evaluator
+
+QUINARY = np.array(evaluator.QUINARY, dtype=np.int64)
+SUIT_COUNT = np.array(evaluator.SUIT_COUNT, dtype=np.int64)
+BIT = np.array(evaluator.BIT, dtype=np.int64)
+
+HOLDINGS = np.array(list(combinations(range(52), 2)), dtype=np.int64)      # The 1326 two-card holdings
+HOLDING_MASKS = BIT[HOLDINGS].sum(axis=1)
+HOLDING_INDEX = np.zeros((52, 52), dtype=np.int64)                         # Position of a holding in HOLDINGS
+HOLDING_INDEX[HOLDINGS[:, 0], HOLDINGS[:, 1]] = HOLDING_INDEX[HOLDINGS[:, 1], HOLDINGS[:, 0]] = np.arange(len(HOLDINGS))
+
+_tables = {}
+
+
+def tables():
+    '''Returns the rank tables as numpy arrays, loading them on first use'''
+    if not _tables:
+        evaluator.load()
+        for name in ('flush_ranks', 'noflush_ranks', 'lo_index', 'lo_cards', 'base'):
+            _tables[name] = np.asarray(getattr(evaluator, name.upper()))
+    return _tables
+
+
+def rank_array(cards, state: evaluator.EvalState=None):
+    '''Takes an (N, k) array of card ids and returns the (N,) array of their ranks.
+    Same ranks as evaluator.rank: a better hand has a higher rank. If state is given, its cards are added to
+    every row (e.g. the board, or hand + board), so k + len(state) must be between 5 and 7.'''
+    t = tables()
+    cards = np.asarray(cards)
+    if state is None: state = evaluator.EvalState()
+
+    key = QUINARY[cards].sum(axis=1) + state.key
+    suits = SUIT_COUNT[cards].sum(axis=1) + state.suits
+
+    hi, lo = np.divmod(key, evaluator.LO_SIZE)
+    ranks = t['noflush_ranks'][t['base'][(hi << 3) | t['lo_cards'][lo]] + t['lo_index'][lo]].astype(np.int32)
+
+    flush = (suits + evaluator.FLUSH_CHECK) & evaluator.FLUSH_BITS
+    rows = np.flatnonzero(flush)
+    if rows.size:
+        suit = (np.log2(flush[rows]).astype(np.int64) - 3) // 4
+        masks = (BIT[cards[rows]].sum(axis=1) | state.mask) >> (13 * suit)
+        ranks[rows] = t['flush_ranks'][masks & evaluator.SUIT_MASK]
+
+    return ranks
+
+
+def holdings(known: int=0):
+    '''(N, 2) array of the two-card holdings that use none of the cards of the 52-bit mask known'''
+    return HOLDINGS[(HOLDING_MASKS & known) == 0]
+
+def holding_index(hand):
+    '''Position of a holding, a list of 2 card ids, in HOLDINGS and in weight vectors'''
+    return int(HOLDING_INDEX[hand[0], hand[1]])
+
+def holding_weights(hands, weights, known: int=0):
+    '''Weights of an (N, 2) array of holdings in a 1326-entry weight vector ordered as HOLDINGS, 0 for the
+    holdings that use a card of the 52-bit mask known'''
+    hands = np.asarray(hands)
+    live = (BIT[hands].sum(axis=1) & known) == 0
+    return np.where(live, np.asarray(weights, dtype=np.float64)[HOLDING_INDEX[hands[:, 0], hands[:, 1]]], 0.0)
+
+def hand_strength_counts(hand, board, weights=None):
+    '''Counts (win, tie, loss) of a hand against every opponent holding on a board of 3 to 5 cards,
+    both lists of card ids. All holdings are ranked in one call. If weights, a 1326-entry vector ordered as
+    HOLDINGS, is given, each holding counts its weight; the ones with a known card or a weight of 0 are skipped.'''
+    known = evaluator.mask_of(list(hand) + list(board))
+    p1_rank = evaluator.rank(list(hand) + list(board))
+
+    if weights is None:
+        p2_ranks = rank_array(holdings(known), evaluator.EvalState(board))
+        win = int(np.count_nonzero(p2_ranks < p1_rank))
+        tie = int(np.count_nonzero(p2_ranks == p1_rank))
+        return win, tie, len(p2_ranks) - win - tie
+
+    weights = np.asarray(weights, dtype=np.float64)
+    live = ((HOLDING_MASKS & known) == 0) & (weights != 0)
+    p2_ranks = rank_array(HOLDINGS[live], evaluator.EvalState(board))
+    weights = weights[live]
+    win = float(weights[p2_ranks < p1_rank].sum())
+    tie = float(weights[p2_ranks == p1_rank].sum())
+    return win, tie, float(weights.sum()) - win - tie
+
+def hand_strength(hand, board, weights=None):
+    '''Hand strength of a hand on a board, both lists of card ids: the fraction of the opponent holdings it beats,
+    ties counting half, each holding counting its weight if weights are given'''
+    win, tie, loss = hand_strength_counts(hand, board, weights)
+    total = win + tie + loss
+    return (win + 0.5 * tie) / total if total else 0.0
+
+
+def with_board(cards, board):
+    '''Appends the same board cards to every row of an (N, k) array of card ids'''
+    cards = np.asarray(cards)
+    return np.hstack([cards, np.broadcast_to(np.asarray(board, dtype=cards.dtype), (len(cards), len(board)))])
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng()
+    hands = np.argsort(rng.random((20000, 52)), axis=1)[:, :7]
+
+    for size in (5, 6, 7):
+        expected = [evaluator.rank(hand) for hand in hands[:, :size].tolist()]
+        assert rank_array(hands[:, :size]).tolist() == expected
+        assert rank_array(hands[:1, 2:size], evaluator.EvalState(hands[0, :2].tolist())).tolist() == expected[:1]
+
+    hand, board = evaluator.card_ids(['As', 'Ah']), evaluator.card_ids(['Ad', 'Ac', '2s', '7h', '9d'])
+    assert hand_strength_counts(hand, board) == (len(holdings(evaluator.mask_of(hand + board))), 0, 0)
+    assert len(holdings(evaluator.mask_of(hand))) == 1225
+
+    hand, board = evaluator.card_ids(['7h', '9h']), evaluator.card_ids(['8h', '6c', '4h', 'Kd'])
+    assert hand_strength_counts(hand, board, np.ones(len(HOLDINGS))) == hand_strength_counts(hand, board)
+    weights = np.zeros(len(HOLDINGS))
+    weights[holding_index(evaluator.card_ids(['Kh', 'Ks']))] = 1
+    weights[holding_index(evaluator.card_ids(['9c', '7c']))] = 2
+    assert hand_strength_counts(hand, board + evaluator.card_ids(['Ts']), weights) == (1.0, 2.0, 0.0)
+    assert (holding_weights(HOLDINGS[:3], weights + 1, evaluator.mask_of(evaluator.card_ids(['2s']))) == [0, 0, 0]).all()
+
+    print('All tests passed.')
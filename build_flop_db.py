@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+'''Builds flop_equity.npy, the flop equity database of flop_db.py, by enumerating every opponent holding and every
+turn and river for each (hole cards, flop) class. Rows are computed in parallel and written to the memory-mapped
+file as they are done, so the build can be stopped, resumed, or split over machines with --start and --stop.'''
+import argparse
+import os
+from multiprocessing import Pool, cpu_count, freeze_support
+from time import time
+
+import numpy as np
+
+import flop_db
+from equity import potential_matrix
+from hand_index import hand_unindex, street_size
+
+parser = argparse.ArgumentParser(
+    prog='Flop database builder',
+    description='Computes the potentials of every hole cards and flop class into flop_equity.npy')
+
+parser.add_argument('--out', type=str, default=flop_db.FLOP_DB_PATH,
+                    help='Database file, created if missing')
+parser.add_argument('--start', type=int, default=0,
+                    help='First class to build')
+parser.add_argument('--stop', type=int, default=street_size(flop_db.FLOP),
+                    help='Class after the last one to build')
+parser.add_argument('--jobs', type=int, default=cpu_count(),
+                    help='Number of worker processes')
+parser.add_argument('--chunk', type=int, default=256,
+                    help='Classes per task')
+
+
+def build_rows(path, start, stop):
+    '''Computes the rows from start to stop that are still missing. Returns the number of rows computed.'''
+    db = np.load(path, mmap_mode='r+')
+    built = 0
+    for index in range(start, stop):
+        if not np.isnan(db[index, 0]): continue
+
+        cards = hand_unindex(flop_db.FLOP, index)
+        matrix = np.array(potential_matrix(cards[:2], cards[2:]), dtype=np.float64)
+        db[index] = (matrix / matrix.sum()).ravel()
+        built += 1
+
+    db.flush()
+    return built
+
+def build_task(task):
+    return build_rows(*task)
+
+
+def main():
+    args = parser.parse_args()
+    if not os.path.exists(args.out):
+        flop_db.create(args.out)
+
+    tasks = [(args.out, start, min(start + args.chunk, args.stop)) for start in range(args.start, args.stop, args.chunk)]
+    started = time()
+    done = built = 0
+    with Pool(args.jobs) as pool:
+        for count in pool.imap_unordered(build_task, tasks):
+            done += 1
+            built += count
+            print(f'\r{done}/{len(tasks)} tasks, {built} rows built in {time() - started:.0f}s', end='', flush=True)
+    print()
+
+
+if __name__ == "__main__":
+    freeze_support()
+    main()
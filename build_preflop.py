@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+'''Builds preflop_equity.npy, the preflop tables of preflop.py, by Monte Carlo simulation of every starting hand
+class in parallel, one task per class.
+
+Each sample deals a board and MAX_OPPONENTS opponent holdings, and the first k opponents give the result against k
+opponents, so every sample counts for all the columns of a class at once. The standard error of the equities is
+below 0.5 / sqrt(samples), 0.0005 with the default.'''
+import argparse
+from multiprocessing import Pool, cpu_count, freeze_support
+from time import time
+
+import numpy as np
+
+import preflop
+from preflop import CLASSES, MAX_OPPONENTS, WIN, EQUITY
+from batch_eval import rank_array, with_board
+from hand_index import hand_unindex
+
+parser = argparse.ArgumentParser(
+    prog='Preflop table builder',
+    description='Simulates the equity of every starting hand class against 1 to 9 random opponents into preflop_equity.npy')
+
+parser.add_argument('--out', type=str, default=preflop.PREFLOP_PATH,
+                    help='Table file')
+parser.add_argument('--samples', type=int, default=1000000,
+                    help='Deals per starting hand class')
+parser.add_argument('--batch', type=int, default=50000,
+                    help='Deals simulated at once')
+parser.add_argument('--seed', type=int, default=0,
+                    help='Seed of the simulation, the table is the same for the same seed and samples')
+parser.add_argument('--jobs', type=int, default=cpu_count(),
+                    help='Number of worker processes')
+
+
+def simulate(hand, samples: int, rng):
+    '''(win, equity) sums of a hand over samples deals, as two (MAX_OPPONENTS,) arrays'''
+    deck = np.array([card for card in range(52) if card not in hand])
+    dealt = deck[np.argsort(rng.random((samples, len(deck))), axis=1)[:, :5 + 2 * MAX_OPPONENTS]]
+
+    board = dealt[:, :5]
+    p1_ranks = rank_array(with_board(board, hand))
+    best = np.zeros(samples, dtype=p1_ranks.dtype)
+    ties = np.zeros(samples, dtype=np.int64)
+
+    win, equity = np.zeros(MAX_OPPONENTS), np.zeros(MAX_OPPONENTS)
+    for opponent in range(MAX_OPPONENTS):
+        p2_ranks = rank_array(np.hstack([dealt[:, 5 + 2 * opponent:7 + 2 * opponent], board]))
+        best = np.maximum(best, p2_ranks)
+        ties += p2_ranks == p1_ranks
+
+        ahead = p1_ranks > best
+        win[opponent] = np.count_nonzero(ahead)
+        equity[opponent] = win[opponent] + ((p1_ranks == best) / (ties + 1)).sum()
+    return win, equity
+
+def build_class(index: int, samples: int, batch: int, seed: int):
+    '''Row of one class: its (win, equity) fractions against 1 to MAX_OPPONENTS opponents'''
+    rng = np.random.default_rng([seed, index])
+    hand = hand_unindex(0, index)
+
+    totals = np.zeros((2, MAX_OPPONENTS))
+    for start in range(0, samples, batch):
+        win, equity = simulate(hand, min(batch, samples - start), rng)
+        totals[WIN] += win
+        totals[EQUITY] += equity
+    return index, totals / samples
+
+def build_task(task):
+    return build_class(*task)
+
+
+def main():
+    args = parser.parse_args()
+
+    table = np.zeros((2, CLASSES, MAX_OPPONENTS), dtype=np.float32)
+    tasks = [(index, args.samples, args.batch, args.seed) for index in range(CLASSES)]
+    started = time()
+    with Pool(args.jobs) as pool:
+        for done, (index, row) in enumerate(pool.imap_unordered(build_task, tasks), 1):
+            table[:, index] = row
+            print(f'\r{done}/{CLASSES} classes in {time() - started:.0f}s', end='', flush=True)
+    print()
+
+    np.save(args.out, table)
+    print(f'Wrote {args.out}')
+
+
+if __name__ == "__main__":
+    freeze_support()
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+'''Builds the hand tables from first principles: poker_hands.bin, the packed file that evaluator.py memory-maps,
+and optionally the poker_hands_5/6/7.json tables of the original game.py and a NumPy .npz of the packed tables.
+
+The JSON tables map the sorted hex values of a hand without a flush to [hand_type, hex values of the best five
+cards]. High cards are left out. They are rebuilt in parallel, one task per hand size and lowest card. Everything is
+checked against the existing JSON tables before anything is written.'''
+import argparse
+import json
+import os
+from itertools import combinations_with_replacement
+from multiprocessing import Pool, cpu_count, freeze_support
+
+import numpy as np
+
+import evaluator
+from evaluator import HIGH_CARD, LO_SIZE, TABLE_LAYOUT, classify_mask
+
+FORMATS = ['bin', 'json', 'npz']
+NPZ_DTYPES = {'B': np.uint8, 'H': np.uint16, 'I': np.uint32, 'Q': np.uint64}
+
+parser = argparse.ArgumentParser(
+    prog='Table builder',
+    description='Builds poker_hands.bin and the other table layouts, checking them against poker_hands_5/6/7.json')
+
+parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['bin'],
+                    help='Layouts to write: bin (poker_hands.bin), json (poker_hands_5/6/7.json), npz (poker_hands.npz)')
+parser.add_argument('--out-dir', type=str, default=os.path.dirname(evaluator.TABLES_PATH),
+                    help='Where to write the tables')
+parser.add_argument('--json-dir', type=str, default=os.path.dirname(os.path.abspath(__file__)),
+                    help='Directory holding the poker_hands_5/6/7.json to check against')
+parser.add_argument('--jobs', type=int, default=cpu_count(),
+                    help='Number of worker processes')
+parser.add_argument('--no-verify', action='store_true',
+                    help='Skip the check against the JSON tables')
+
+
+def hex_values(values):
+    return ''.join(hex(value)[2:].upper() for value in values)
+
+def json_entries(size, low):
+    '''JSON table entries of the hands of size cards whose lowest rank is low'''
+    entries = {}
+    for ranks in combinations_with_replacement(range(low, 13), size - 1):
+        ranks = (low,) + ranks
+        if max(ranks.count(rank) for rank in ranks) > 4: continue
+
+        # Card i gets suit i % 4, so no suit holds more than 2 of the 7 cards
+        mask = 0
+        for idx, rank in enumerate(ranks):
+            mask |= 1 << (13 * (idx % 4) + rank)
+
+        hand_type, values = classify_mask(mask)
+        if hand_type != HIGH_CARD:
+            entries[hex_values(rank + 2 for rank in ranks)] = [hand_type, hex_values(values)]
+    return size, entries
+
+def build_json(jobs):
+    '''Builds the JSON tables in parallel. Returns {size: table}.'''
+    tables = {size: {} for size in (5, 6, 7)}
+    with Pool(jobs) as pool:
+        for size, entries in pool.starmap(json_entries, [(size, low) for size in (5, 6, 7) for low in range(13)]):
+            tables[size].update(entries)
+    return tables
+
+
+def lookup(tables, ranks):
+    '''(hand_type, hex string of the best five cards) of a sorted list of ranks, in the JSON tables format'''
+    key = sum(5 ** rank for rank in ranks)
+    hi, lo = divmod(key, LO_SIZE)
+    hand_rank = tables['noflush_ranks'][tables['base'][(hi << 3) | tables['lo_cards'][lo]] + tables['lo_index'][lo]]
+    values = tables['pattern'][5 * hand_rank:5 * hand_rank + 5]
+    return tables['hand_type'][hand_rank], hex_values(values)
+
+def load_json(json_dir, size):
+    with open(os.path.join(json_dir, f'poker_hands_{size}.json')) as fp:
+        return json.load(fp)
+
+def verify(tables, json_tables, json_dir):
+    '''Checks the packed tables and the rebuilt JSON tables against poker_hands_5/6/7.json. Returns the number of mismatches.'''
+    mismatches = 0
+    for size in (5, 6, 7):
+        poker_hands = load_json(json_dir, size)
+
+        for ranks in combinations_with_replacement(range(13), size):
+            if max(ranks.count(rank) for rank in ranks) > 4: continue
+
+            converted_hand = hex_values(rank + 2 for rank in ranks)
+            hand_type, poker_hand = lookup(tables, ranks)
+            expected = poker_hands.get(converted_hand, [HIGH_CARD, None])
+
+            if expected[0] != hand_type or (hand_type != HIGH_CARD and expected[1] != poker_hand):
+                mismatches += 1
+                print(f'{converted_hand}: expected {expected}, built {[hand_type, poker_hand]}')
+
+        if json_tables[size] != poker_hands:
+            diff = poker_hands.keys() ^ json_tables[size].keys()
+            diff |= {key for key in poker_hands.keys() & json_tables[size].keys() if poker_hands[key] != json_tables[size][key]}
+            mismatches += len(diff)
+            print(f'poker_hands_{size}.json: {len(diff)} entries differ from the rebuilt table, e.g. {sorted(diff)[:5]}')
+
+        print(f'poker_hands_{size}.json: {len(poker_hands)} entries checked')
+    return mismatches
+
+
+def save_json(json_tables, out_dir):
+    for size, table in json_tables.items():
+        path = os.path.join(out_dir, f'poker_hands_{size}.json')
+        with open(path, 'w') as fp:
+            # One entry per line, the layout of the original files
+            fp.write('{\n' + ',\n'.join(f'    {json.dumps(key)}: {json.dumps(value)}' for key, value in table.items()) + '\n}\n')
+        print(f'Wrote {path} ({os.path.getsize(path)} bytes)')
+
+def save_npz(tables, out_dir):
+    path = os.path.join(out_dir, 'poker_hands.npz')
+    np.savez(path, **{name: np.array(tables[name], dtype=NPZ_DTYPES[code]) for name, code in TABLE_LAYOUT})
+    print(f'Wrote {path} ({os.path.getsize(path)} bytes)')
+
+def main():
+    args = parser.parse_args()
+
+    tables = evaluator.build_tables()
+    json_tables = build_json(args.jobs) if 'json' in args.formats or not args.no_verify else None
+
+    if not args.no_verify and verify(tables, json_tables, args.json_dir):
+        raise SystemExit('Tables do not match the JSON tables, nothing written.')
+
+    if 'bin' in args.formats:
+        path = os.path.join(args.out_dir, os.path.basename(evaluator.TABLES_PATH))
+        evaluator.save_tables(tables, path)
+        print(f'Wrote {path} ({os.path.getsize(path)} bytes)')
+    if 'json' in args.formats:
+        save_json(json_tables, args.out_dir)
+    if 'npz' in args.formats:
+        save_npz(tables, args.out_dir)
+
+
+if __name__ == "__main__":
+    freeze_support()
+    main()
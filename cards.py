@@ -9,6 +9,7 @@ class Cards:
         self.value = value
         self.hex_value = hex(value)[2:].upper()
         self.num = num
+        self.id = num - 1                   # Integer id used by the evaluator module
 
     def __repr__(self):
         return self.shortName
@@ -101,6 +102,17 @@ class Deck:
         '''Removes top card of deck, doesn't return anything.'''
         self.deck.delete()
     
+    def ids(self):
+        '''Returns the ids of the cards left in the deck'''
+        return [card.id for card in self.deck]
+
+    def mask(self):
+        '''Returns the 52-bit mask of the cards left in the deck'''
+        mask = 0
+        for card in self.deck:
+            mask |= 1 << card.id
+        return mask
+
     def remove_card(self, cards: list[Cards]):
         card_nums = [card.num for card in cards]
         self.deck = [card for card in self.deck if card.num not in card_nums]
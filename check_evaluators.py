@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+'''Cross-checks the hand evaluators of the repo against treys, and measures their speed.
+
+Every five-card hand is checked, then random samples of six and seven-card hands. treys ranks hands from 1 (royal
+flush) to 7462, so a hand of treys rank r must have evaluator rank 7463 - r, and handEval must return the hand type
+and card values of that rank.'''
+import argparse
+from itertools import combinations, islice
+from random import Random
+from time import perf_counter
+
+import numpy as np
+from treys import Card, Evaluator
+
+import evaluator
+from evaluator import CARD_NAMES, HAND_COUNT, EvalState, describe
+from batch_eval import rank_array
+from rank_cache import RankCache
+import game
+import cards
+import eval.game
+import eval.cards
+
+parser = argparse.ArgumentParser(
+    prog='Evaluator check',
+    description='Checks every hand evaluator against treys and reports hands/sec for each')
+
+parser.add_argument('--samples', type=int, default=200000,
+                    help='Number of random hands of 6 and of 7 cards')
+parser.add_argument('--chunk', type=int, default=100000,
+                    help='Hands evaluated per batch')
+parser.add_argument('--seed', type=int, default=None,
+                    help='Seed of the random samples')
+parser.add_argument('--skip-exhaustive', action='store_true',
+                    help='Skip the 2,598,960 five-card hands')
+parser.add_argument('--max-mismatches', type=int, default=10,
+                    help='Mismatches printed per evaluator and hand size')
+
+
+TREYS_CARDS = [Card.new(name) for name in CARD_NAMES]
+treys_evaluator = Evaluator()
+
+
+def hand_eval(module, card_module):
+    '''Wraps Player.handEval of a game module. Returns (hand_type, values) of the best five cards.'''
+    player = module.Player('Check')
+    deck = [card_module.Deck.get(name) for name in CARD_NAMES]
+
+    def evaluate(hand):
+        hand_type, best = player.handEval([deck[card] for card in hand])
+        return hand_type, tuple(card.value for card in best)
+    return evaluate
+
+def rank_cached():
+    cache = RankCache()
+    return lambda hand: cache.rank(EvalState(hand))
+
+def treys_rank(hand):
+    '''treys rank converted to an evaluator rank'''
+    return HAND_COUNT + 1 - treys_evaluator.evaluate([TREYS_CARDS[card] for card in hand[:2]],
+                                                      [TREYS_CARDS[card] for card in hand[2:]])
+
+EVALUATORS = {
+    'evaluator.rank': evaluator.rank,
+    'rank_cache': rank_cached(),
+    'game.handEval': hand_eval(game, cards),
+    'eval/game.handEval': hand_eval(eval.game, eval.cards),
+}
+
+
+class Report():
+    def __init__(self, size, max_mismatches):
+        self.size = size
+        self.max_mismatches = max_mismatches
+        self.hands = 0
+        self.times = {name: 0.0 for name in ['treys', 'batch_eval.rank_array', *EVALUATORS]}
+        self.mismatches = {name: 0 for name in self.times}
+
+    def mismatch(self, name, hand, expected, got):
+        self.mismatches[name] += 1
+        if self.mismatches[name] <= self.max_mismatches:
+            print(f'{name} {[CARD_NAMES[card] for card in hand]}: expected {expected}, got {got}')
+
+    def check(self, hands):
+        '''Evaluates a batch of hands with every evaluator and compares them with treys'''
+        self.hands += len(hands)
+
+        start = perf_counter()
+        expected = [treys_rank(hand) for hand in hands]
+        self.times['treys'] += perf_counter() - start
+
+        start = perf_counter()
+        ranks = rank_array(np.array(hands, dtype=np.int64)).tolist()
+        self.times['batch_eval.rank_array'] += perf_counter() - start
+        for hand, want, got in zip(hands, expected, ranks):
+            if want != got: self.mismatch('batch_eval.rank_array', hand, want, got)
+
+        for name, evaluate in EVALUATORS.items():
+            start = perf_counter()
+            results = [evaluate(hand) for hand in hands]
+            self.times[name] += perf_counter() - start
+
+            for hand, want, got in zip(hands, expected, results):
+                if isinstance(got, tuple): want = describe(want)
+                if want != got: self.mismatch(name, hand, want, got)
+
+    def show(self):
+        print(f'{self.size} cards, {self.hands} hands')
+        for name, elapsed in self.times.items():
+            print(f'  {name:24}{self.mismatches[name]:>8} mismatches{self.hands / elapsed:>14,.0f} hands/sec')
+        return sum(self.mismatches.values())
+
+
+def random_hands(rng, size, count):
+    for _ in range(count):
+        yield tuple(rng.sample(range(52), size))
+
+def run(hands, size, args):
+    report = Report(size, args.max_mismatches)
+    while chunk := list(islice(hands, args.chunk)):
+        report.check(chunk)
+    return report.show()
+
+
+def main(args):
+    rng = Random(args.seed)
+    mismatches = 0
+    if not args.skip_exhaustive:
+        mismatches += run(combinations(range(52), 5), 5, args)
+    for size in (6, 7):
+        mismatches += run(random_hands(rng, size, args.samples), size, args)
+
+    print('All evaluators agree with treys.' if not mismatches else f'{mismatches} mismatches.')
+    return mismatches
+
+
+if __name__ == "__main__":
+    exit(1 if main(parser.parse_args()) else 0)
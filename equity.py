@@ -0,0 +1,374 @@
+'''Hand strength and hand potential against one random opponent holding.
+
+The potentials are a 3x3 matrix: rows are where we stand against the opponent now (ahead, tied, behind), and
+columns where we stand once the board is complete (win, tie, loss). Each entry counts (opponent holding, runout)
+pairs, see Billings et al., "Opponent Modeling in Poker".'''
+import time
+from itertools import combinations
+
+import numpy as np
+
+from evaluator import EvalState, mask_of, ids_of, FULL_DECK
+from batch_eval import rank_array, hand_strength, hand_strength_counts, holding_weights, BIT
+from hand_index import suit_symmetries, canonical
+from sampling import StratifiedMean, confidence_bounds, band, banded
+import flop_db
+import equity_store
+from worker_pool import map_chunks, shared_cache
+
+AHEAD, TIED, BEHIND = 0, 1, 2
+MIN_STRATUM_SAMPLES = 8         # Holdings of each stratum needed before trusting the standard error
+
+
+def runouts(p1_state: EvalState, look_ahead: int, deck: list[int], ranker=rank_array):
+    '''(boards, board masks, our ranks) of every runout of look_ahead cards of deck. ranker ranks our hand on the
+    runouts, e.g. a shared cache.'''
+    boards = np.array(list(combinations(deck, look_ahead)))
+    return boards, BIT[boards].sum(axis=1), ranker(boards, p1_state)
+
+def standing(p1_rank: int, p2_rank: int):
+    return AHEAD if p1_rank > p2_rank else TIED if p1_rank == p2_rank else BEHIND
+
+def holding_counts(runs, p2_state: EvalState, p2_hand):
+    '''(win, tie, loss) counts against one opponent hand over the runouts its cards do not block'''
+    boards, board_masks, p1_ranks = runs
+    open_boards = (board_masks & mask_of(p2_hand)) == 0
+
+    p1_ranks_7 = p1_ranks[open_boards]
+    p2_ranks_7 = rank_array(boards[open_boards], p2_state)
+
+    win = int((p1_ranks_7 > p2_ranks_7).sum())
+    tie = int((p1_ranks_7 == p2_ranks_7).sum())
+    return win, tie, len(p1_ranks_7) - win - tie
+
+def holding_equity(standing: int, win: int, tie: int, loss: int):
+    '''Share of the pot won against one opponent holding over its runouts, ties counting half'''
+    return (win + tie / 2) / (win + tie + loss)
+
+def runout_potentials(p1_state: EvalState, board_state: EvalState, look_ahead: int, deck: list[int], p2_hands,
+                      only_ppot: bool=False, ranker=rank_array):
+    '''Potentials summed over a list of (opponent hand, weight), for every runout of look_ahead cards of deck.
+    If only_ppot, opponent hands we are ahead of are skipped. ranker ranks our hand on the runouts,
+    e.g. a shared cache.'''
+    p1_rank_5 = p1_state.rank()
+
+    # Our ranks on every runout, computed once. Each opponent hand then only ranks its own hand on the
+    # runouts its cards do not block.
+    runs = runouts(p1_state, look_ahead, deck, ranker)
+
+    hand_potentials = [[0] * 3 for _ in range(3)]
+    for p2_hand, weight in p2_hands:
+        p2_state = board_state.extend(p2_hand)
+        i = standing(p1_rank_5, p2_state.rank())
+        if only_ppot and i == AHEAD: continue    # ppot does not need cases where we are winning
+
+        for j, count in enumerate(holding_counts(runs, p2_state, p2_hand)):
+            hand_potentials[i][j] += weight * count
+
+    return hand_potentials
+
+def opponent_hands(hand, board, p2_hands=None, weights=None):
+    '''(opponent hand, weight) for every opponent holding, or for p2_hands, with the holdings that a suit symmetry
+    of the hand and the board maps onto each other collapsed into one, weighted by their number.
+    weights is an optional 1326-entry vector ordered as batch_eval.HOLDINGS: holdings then also count their own
+    weight, only holdings of equal weight are collapsed, and the ones of weight 0 are left out.'''
+    if p2_hands is None:
+        p2_hands = list(combinations(ids_of(FULL_DECK & ~mask_of(list(hand) + list(board))), 2))
+    p2_hands = np.array(p2_hands)
+
+    if weights is None:
+        rows, counts = canonical(p2_hands, suit_symmetries(hand, board))
+        return list(zip(p2_hands[rows].tolist(), counts.tolist()))
+
+    p2_weights = holding_weights(p2_hands, weights, mask_of(list(hand) + list(board)))
+    p2_hands, p2_weights = p2_hands[p2_weights != 0], p2_weights[p2_weights != 0]
+    rows, counts = canonical(p2_hands, suit_symmetries(hand, board), p2_weights)
+    return list(zip(p2_hands[rows].tolist(), (counts * p2_weights[rows]).tolist()))
+
+def potential_matrix(hand, board, only_ppot: bool=False, weights=None):
+    '''Potentials of a hand on a flop or turn, both lists of card ids, over every opponent holding and runout,
+    the holdings weighted by weights if given, see opponent_hands'''
+    board_state = EvalState(board)
+    deck = ids_of(FULL_DECK & ~mask_of(list(hand) + list(board)))
+    return runout_potentials(board_state.extend(hand), board_state, 5 - len(board), deck,
+                             opponent_hands(hand, board, weights=weights), only_ppot)
+
+def anytime_potentials(hand, board, deadline: float=None, stderr: float=None, only_ppot: bool=False, weights=None,
+                       seed=None, strata: int=1, thresholds=None, confidence: float=None, score=holding_equity):
+    '''Potentials of a hand on a flop or turn over the opponent holdings taken in random order, every runout of each,
+    until the time.monotonic() deadline passes, the standard error of the river equity is at most stderr, or every
+    holding is done. The holdings are weighted by weights if given, see opponent_hands.
+
+    With strata > 1, the holdings are split into that many strata of nearly equal size by how their hand ranks on
+    the current board, and taken in an order that samples every stratum in proportion to its size. The equity is
+    then estimated stratum by stratum, see sampling.py.
+
+    The estimate is the weighted mean of score(standing, win, tie, loss) over the holdings, by default the river
+    equity. Its 'bounds' always hold it for sure, as every holding left scores between 0 and 1, and they are narrowed
+    to a confidence interval of that level if confidence is given. With sorted thresholds, the enumeration also stops
+    once the bounds lie in a single band between two thresholds. The result then holds that 'band' and its
+    'band_limits', both None if the deadline or stderr stopped the enumeration before the band was settled (see
+    sampling.banded), and an estimate kept within the bounds.
+
+    Returns the matrix so far, the estimate with its standard error, the variance per sample (the squared standard
+    error times the number of samples), and the number of (holding, runout) pairs evaluated, under 'matrix',
+    'equity', 'stderr', 'variance' and 'samples'.'''
+    board_state = EvalState(board)
+    p1_state = board_state.extend(hand)
+    p1_rank_5 = p1_state.rank()
+    deck = ids_of(FULL_DECK & ~mask_of(list(hand) + list(board)))
+    runs = runouts(p1_state, 5 - len(board), deck)
+
+    p2_hands = opponent_hands(hand, board, weights=weights)
+    p2_ranks_5 = rank_array(np.array([p2_hand for p2_hand, _ in p2_hands]), board_state)
+    if only_ppot:
+        # ppot does not need cases where we are winning
+        p2_hands = [p2_hand for p2_hand, p2_rank_5 in zip(p2_hands, p2_ranks_5) if p2_rank_5 >= p1_rank_5]
+        p2_ranks_5 = p2_ranks_5[p2_ranks_5 >= p1_rank_5]
+
+    if not p2_hands:
+        return banded({'matrix': [[0] * 3 for _ in range(3)], 'equity': 0.0, 'stderr': 0.0, 'variance': 0.0,
+                       'samples': 0, 'bounds': (0.0, 0.0)}, thresholds)
+
+    rng = np.random.default_rng(seed)
+    groups = np.zeros(len(p2_hands), dtype=np.int64)
+    groups[np.argsort(p2_ranks_5, kind='stable')] = np.arange(len(p2_hands)) * strata // len(p2_hands)
+    counts = np.bincount(groups, minlength=strata)
+    # The k-th holding of a stratum of n comes at about k / n of the way, so every prefix is nearly proportional
+    shuffled = np.lexsort((rng.random(len(p2_hands)), groups))
+    within = np.empty(len(p2_hands))
+    within[shuffled] = np.arange(len(p2_hands)) - np.repeat(np.cumsum(counts) - counts, counts)
+    order = np.argsort((within + rng.random(len(p2_hands))) / counts[groups], kind='stable')
+
+    estimate = StratifiedMean(np.bincount(groups, [weight for _, weight in p2_hands], minlength=strata), counts,
+                              MIN_STRATUM_SAMPLES)
+    total_weight = float(sum(weight for _, weight in p2_hands))
+    done_weight = done_score = 0.0
+    hand_potentials = [[0] * 3 for _ in range(3)]
+    samples = 0
+    started = time.monotonic()
+    for done, position in enumerate(order, 1):
+        p2_hand, weight = p2_hands[position]
+        p2_state = board_state.extend(p2_hand)
+        i = standing(p1_rank_5, int(p2_ranks_5[position]))
+
+        win, tie, loss = holding_counts(runs, p2_state, p2_hand)
+        for j, count in enumerate((win, tie, loss)):
+            hand_potentials[i][j] += weight * count
+        value = score(i, win, tie, loss)
+        estimate.add([groups[position]], [value], [weight])
+        samples += win + tie + loss
+        done_weight += weight
+        done_score += weight * value
+
+        if stderr is not None and estimate.stderr() <= stderr: break
+        if thresholds is not None and band(thresholds, *equity_bounds(estimate, done_score, done_weight, total_weight,
+                                                                       confidence)) is not None: break
+        if deadline is not None:
+            # Stop before the next holding would end after the deadline
+            now = time.monotonic()
+            if now + (now - started) / done > deadline: break
+
+    variance = estimate.variance() if samples else float('inf')
+    return banded({'matrix': hand_potentials, 'equity': estimate.mean(), 'stderr': variance ** 0.5,
+                   'variance': variance * samples, 'samples': samples,
+                   'bounds': equity_bounds(estimate, done_score, done_weight, total_weight, confidence)}, thresholds)
+
+def equity_bounds(estimate: StratifiedMean, done_score: float, done_weight: float, total_weight: float,
+                  confidence: float=None):
+    '''(lower, upper) bounds of the mean score over every holding, from the weighted score of those done so far and
+    the weight of those left, and the confidence interval of the estimate if confidence is given'''
+    lower, upper = done_score / total_weight, (done_score + total_weight - done_weight) / total_weight
+    if confidence is not None:
+        mean = min(max(estimate.mean(), lower), upper)
+        lower, upper = confidence_bounds(mean, estimate.stderr(), confidence, lower, upper)
+    return lower, upper
+
+def river_equity(matrix):
+    '''Share of the pot won once the board is complete, ties counting half, over a potentials matrix'''
+    total = sum(map(sum, matrix))
+    return (sum(row[0] for row in matrix) + sum(row[1] for row in matrix) / 2) / total if total else 0.0
+
+def potentials(matrix):
+    '''(hand strength, positive potential, negative potential) of a potentials matrix'''
+    total = [sum(row) for row in matrix]
+
+    hs = (total[AHEAD] + total[TIED] / 2) / sum(total)
+
+    behind = total[BEHIND] + total[TIED] / 2
+    ppot = (matrix[BEHIND][0] + matrix[BEHIND][1] / 2 + matrix[TIED][0] / 2) / behind if behind else 0.0
+
+    ahead = total[AHEAD] + total[TIED] / 2
+    npot = (matrix[AHEAD][2] + matrix[TIED][2] / 2 + matrix[AHEAD][1] / 2) / ahead if ahead else 0.0
+
+    return hs, ppot, npot
+
+def analysis(matrix, opponents: int=1):
+    '''Everything a potentials matrix gives, as a dict: the 'matrix' itself, the hand strength 'hs' against a number
+    of opponents (the hand strength to the power of their number), 'ppot', 'npot', the effective hand strength
+    'ehs' = hs + (1 - hs) * ppot, and the river 'equity' of the matrix'''
+    hs, ppot, npot = potentials(matrix)
+    hs **= opponents
+    return {'matrix': matrix, 'hs': hs, 'ppot': ppot, 'npot': npot, 'ehs': hs + (1 - hs) * ppot,
+            'equity': river_equity(matrix)}
+
+def known_matrix(hand, board, weights=None):
+    '''Potentials matrix of a hand on a board of 3 to 5 cards, both lists of card ids, when it comes without an
+    enumeration of the runouts, else None: on the river the matrix is diagonal, and an unweighted flop or turn may be
+    in the flop database or the equity store. The holdings are weighted by weights if given, see opponent_hands.'''
+    if len(board) == 5:
+        win, tie, loss = hand_strength_counts(hand, board, weights)
+        return [[win, 0, 0], [0, tie, 0], [0, 0, loss]]
+    if weights is not None: return None
+
+    matrix = flop_db.lookup(hand, board) if len(board) == 3 else None
+    if matrix is None:
+        matrix = equity_store.store().get('potentials', hand, board)
+    return matrix
+
+def hand_matrix(hand, board, weights=None, compute=None):
+    '''known_matrix, else the matrix computed by compute(), potential_matrix by default, and kept in the equity store
+    when the holdings are unweighted'''
+    matrix = known_matrix(hand, board, weights)
+    if matrix is None:
+        matrix = compute() if compute is not None else potential_matrix(hand, board, weights=weights)
+        if weights is None:
+            equity_store.store().put('potentials', hand, board, 1, matrix)
+    return matrix
+
+def hand_analysis(hand, board, weights=None, opponents: int=1, compute=None):
+    '''analysis of the hand_matrix of a hand on a board of 3 to 5 cards'''
+    return analysis(hand_matrix(hand, board, weights, compute), opponents)
+
+def pool_chunk(context, p2_hands):
+    '''Potentials summed over a chunk of (opponent hand, weight), in a worker of the worker pool'''
+    p1_state, board_state, look_ahead, only_ppot, deck_mask = context
+    return runout_potentials(p1_state, board_state, look_ahead, ids_of(deck_mask), p2_hands, only_ppot,
+                             shared_cache().rank_array)
+
+def pooled_matrix(hand, board, only_ppot: bool=False, weights=None, p2_hands=None):
+    '''potential_matrix split across the worker pool, over the holdings p2_hands only if given'''
+    board_state = EvalState(board)
+    p1_state = board_state.extend(hand)
+    deck_mask = FULL_DECK & ~mask_of(list(hand) + list(board))
+
+    hand_potentials = [[0] * 3 for _ in range(3)]
+    results = map_chunks(pool_chunk, (p1_state, board_state, 5 - len(board), only_ppot, deck_mask),
+                         opponent_hands(hand, board, p2_hands, weights))
+    for result in results:
+        for i in range(3):
+            for j in range(3):
+                hand_potentials[i][j] += result[i][j]
+    return hand_potentials
+
+
+class HandEquity():
+    '''Hand strength and potential of a hand, for the evaluator classes of the bots to build on. hand_ids and
+    board_ids are lists of card ids. weights is an optional 1326-entry vector of the likelihood of each opponent
+    holding, ordered as batch_eval.HOLDINGS, e.g. from batch_eval.holding_index. Every holding is equally likely by
+    default.
+
+    band tells the band of matrix_value over the potentials matrix, estimated as the mean of holding_value against
+    each opponent holding, see anytime_potentials. Subclasses may change both, and how compute_matrix and
+    known_matrix get the matrix.'''
+    matrix_value = staticmethod(river_equity)
+    holding_value = staticmethod(holding_equity)
+
+    def __init__(self, hand_ids, board_ids, weights=None):
+        self.hand_ids = list(hand_ids)
+        self.board_ids = list(board_ids)
+        self.weights = weights
+
+    def hand_strength(self):
+        '''Determine the hand strength of your current cards + cards on the board'''
+        return hand_strength(self.hand_ids, self.board_ids, self.weights)
+
+    def hand_strength_counts(self):
+        '''(win, tie, loss) counts of your current cards + cards on the board against every opponent holding'''
+        return hand_strength_counts(self.hand_ids, self.board_ids, self.weights)
+
+    def known_matrix(self):
+        '''Potentials matrix of the hand if it comes without an enumeration, else None, see known_matrix'''
+        return known_matrix(self.hand_ids, self.board_ids, self.weights)
+
+    def compute_matrix(self):
+        '''Potentials matrix of the hand from an enumeration of every holding and runout'''
+        return potential_matrix(self.hand_ids, self.board_ids, weights=self.weights)
+
+    def matrix(self):
+        '''Potentials matrix of the hand, see hand_matrix'''
+        return hand_matrix(self.hand_ids, self.board_ids, self.weights, self.compute_matrix)
+
+    def analysis(self, opponents=1):
+        '''Transition matrix, HS, PPOT, NPOT, EHS and river equity of the hand from a single pass, see analysis'''
+        return analysis(self.matrix(), opponents)
+
+    def band(self, thresholds, confidence=None, deadline=None, strata=8):
+        '''Band of matrix_value among sorted thresholds, see sampling.band. It is exact when known_matrix has the spot,
+        and else estimated from as few opponent holdings as it takes to tell the band for sure, or with the given
+        confidence, see anytime_potentials. Returns a dict with the value under 'equity', its 'bounds', the 'band'
+        and its 'band_limits', None if the deadline came before the band was settled.'''
+        matrix = self.known_matrix()
+        if matrix is None:
+            return anytime_potentials(self.hand_ids, self.board_ids, deadline, weights=self.weights, strata=strata,
+                                      thresholds=thresholds, confidence=confidence, score=self.holding_value)
+        value = self.matrix_value(matrix)
+        return banded({'equity': value, 'stderr': 0.0, 'samples': 0, 'bounds': (value, value)}, thresholds)
+
+if __name__ == "__main__":
+    from evaluator import card_ids
+    equity_store.configure(':memory:')
+
+    hand, board = card_ids(['7h', '9h']), card_ids(['8h', '6c', '4h'])
+    matrix = potential_matrix(hand, board)
+    hs, ppot, npot = potentials(matrix)
+
+    assert sum(map(sum, matrix)) == 1081 * 990
+    assert abs(hs - hand_strength(hand, board)) < 1e-12
+    assert 0 < ppot < 1 and 0 < npot < 1
+    assert potential_matrix(hand, board, only_ppot=True)[AHEAD] == [0, 0, 0]
+
+    from batch_eval import HOLDINGS, HOLDING_MASKS
+    assert potential_matrix(hand, board, weights=np.ones(len(HOLDINGS))) == matrix
+    weights = np.where(HOLDING_MASKS & mask_of(card_ids(['As', 'Ks', 'Ah', 'Kh', 'Ad', 'Kd', 'Ac', 'Kc'])), 2.0, 0.5)
+    weighted = potential_matrix(hand, board, weights=weights)
+    assert abs(potentials(weighted)[0] - hand_strength(hand, board, weights)) < 1e-12
+
+    exact = anytime_potentials(hand, board, seed=0)
+    assert exact['matrix'] == matrix and exact['stderr'] == 0.0 and exact['samples'] == len(opponent_hands(hand, board)) * 990
+    assert abs(exact['equity'] - river_equity(matrix)) < 1e-12
+    early = anytime_potentials(hand, board, stderr=0.02, seed=0)
+    assert early['samples'] < exact['samples'] and early['stderr'] <= 0.02
+    assert abs(early['equity'] - exact['equity']) < 4 * 0.02
+    started = time.monotonic()
+    late = anytime_potentials(hand, board, deadline=started + 0.02, seed=0)
+    assert time.monotonic() - started < 0.05 and late['samples'] < exact['samples']
+
+    stats = hand_analysis(hand, board + card_ids(['Kd']), opponents=2)
+    hs, ppot, npot = potentials(potential_matrix(hand, board + card_ids(['Kd'])))
+    assert (stats['hs'], stats['ppot'], stats['npot']) == (hs ** 2, ppot, npot)
+    assert abs(stats['ehs'] - (hs ** 2 + (1 - hs ** 2) * ppot)) < 1e-12
+    river = hand_analysis(hand, board + card_ids(['Kd', '2s']))
+    assert river['ppot'] == river['npot'] == 0 and river['hs'] == river['equity'] == river['ehs']
+
+    stratified = anytime_potentials(hand, board, stderr=0.01, seed=0, strata=8)
+    assert stratified['stderr'] <= 0.01 and abs(stratified['equity'] - exact['equity']) < 4 * 0.01
+    assert anytime_potentials(hand, board, seed=0, strata=8)['stderr'] == 0.0
+    assert anytime_potentials(hand, board, only_ppot=True, strata=8)['matrix'] == potential_matrix(hand, board, True)
+
+    # Bands: a clear-cut spot is decided early, and its true equity is in the band whatever the order of the holdings
+    thresholds = [0.25, 0.45, 0.65, 0.75]
+    aces, dry = card_ids(['As', 'Ah']), card_ids(['Ad', 'Tc', '3c'])
+    aces_matrix = potential_matrix(aces, dry)
+    truth = river_equity(aces_matrix)
+    provable = anytime_potentials(aces, dry, seed=0, strata=8, thresholds=thresholds)
+    assert provable['band'] == 4 and provable['band_limits'] == (0.75, 1.0)
+    assert provable['bounds'][0] <= truth <= provable['bounds'][1] and provable['samples'] < sum(map(sum, aces_matrix))
+    for seed in range(5):
+        confident = anytime_potentials(aces, dry, seed=seed, strata=8, thresholds=thresholds, confidence=0.99)
+        assert confident['band'] == 4 and confident['samples'] < sum(map(sum, aces_matrix)) / 10
+    assert anytime_potentials(hand, board, seed=0, thresholds=[exact['equity']])['samples'] == exact['samples']
+    unsettled = anytime_potentials(hand, board, seed=0, strata=8, stderr=0.05, thresholds=[exact['equity']])
+    assert unsettled['band'] is None and unsettled['band_limits'] is None
+
+    print('All tests passed.')
@@ -0,0 +1,132 @@
+'''Equity of one hand from the flop to the river, computed once on the flop and reused on the later streets.
+
+On the flop, the session ranks every opponent holding on every turn and river pair, and keeps the outcome of each
+(holding, runout) as a byte: the turn and river results of the hand are all in there. The potentials matrix (see
+equity.py) of the turn is the part of the table whose runouts hold the turn card, with the rows given by the 6-card
+ranks, and the river is a single column. Later streets only slice the table and rank the current board, and opponent
+weights can change from query to query since the outcomes are stored unweighted. The table is only built on the
+first query, so a session costs nothing on streets answered from elsewhere, e.g. the equity store.'''
+from itertools import combinations
+
+import numpy as np
+
+from evaluator import EvalState, mask_of, ids_of, FULL_DECK
+from batch_eval import rank_array, holding_weights, BIT
+from equity import analysis, AHEAD, TIED, BEHIND
+
+BLOCKED, WIN, TIE, LOSS = 0, 1, 2, 3
+CHUNK = 64          # Holdings ranked at once
+
+
+class EquitySession():
+    '''Outcomes of hole cards against every opponent holding and runout of a flop, both lists of card ids'''
+    def __init__(self, hand, flop):
+        assert len(flop) == 3, 'a session starts on the flop'
+        self.hand, self.flop = list(hand), list(flop)
+        self.flop_state = EvalState(self.flop)
+        self.p1_state = self.flop_state.extend(self.hand)
+
+        deck = ids_of(FULL_DECK & ~mask_of(self.hand + self.flop))
+        self.holdings = np.array(list(combinations(deck, 2)), dtype=np.int64)
+        self.runouts = self.holdings        # Turn and river pairs are drawn from the same cards
+        self.holding_masks = BIT[self.holdings].sum(axis=1)
+        self.column = {(int(a), int(b)): idx for idx, (a, b) in enumerate(self.runouts.tolist())}
+
+        self._outcomes = None
+
+    @property
+    def outcomes(self):
+        if self._outcomes is None:
+            self._outcomes = self.enumerate()
+        return self._outcomes
+
+    def enumerate(self):
+        '''(holdings, runouts) array of the outcome of every pair, BLOCKED when they share a card'''
+        p1_ranks = rank_array(self.runouts, self.p1_state)
+        outcomes = np.full((len(self.holdings), len(self.runouts)), BLOCKED, dtype=np.int8)
+
+        for start in range(0, len(self.holdings), CHUNK):
+            holdings = self.holdings[start:start + CHUNK]
+            open_pairs = (self.holding_masks[start:start + CHUNK, None] & self.holding_masks[None, :]) == 0
+            rows, cols = np.nonzero(open_pairs)
+
+            p2_ranks = rank_array(np.hstack([holdings[rows], self.runouts[cols]]), self.flop_state)
+            p1 = p1_ranks[cols]
+            outcomes[start + rows, cols] = np.where(p1 > p2_ranks, WIN, np.where(p1 == p2_ranks, TIE, LOSS))
+        return outcomes
+
+    def weights_of(self, board, weights=None):
+        '''Weight of each holding: 0 when it holds a board card, else its entry of weights or 1'''
+        known = mask_of(list(board))
+        if weights is None:
+            return ((self.holding_masks & known) == 0).astype(np.float64)
+        return holding_weights(self.holdings, weights, known)
+
+    def matrix(self, board, weights=None):
+        '''Potentials matrix of the hand on the flop, a turn or a river of this flop, as a list of card ids.
+        The holdings are weighted by a 1326-entry vector ordered as batch_eval.HOLDINGS, if given.'''
+        board = list(board)
+        assert board[:3] == self.flop, 'the board must start with the flop of the session'
+        turn_river = board[3:]
+
+        if len(turn_river) == 0:
+            columns = slice(None)
+        elif len(turn_river) == 1:
+            rivers = ids_of(FULL_DECK & ~mask_of(self.hand + board))
+            columns = [self.column[tuple(sorted((turn_river[0], river)))] for river in rivers]
+        else:
+            columns = [self.column[tuple(sorted(turn_river))]]
+
+        live = self.weights_of(board, weights)
+        rows = np.flatnonzero(live)
+        outcomes = self.outcomes[rows][:, columns]
+        counts = np.stack([(outcomes == outcome).sum(axis=1) for outcome in (WIN, TIE, LOSS)], axis=1)
+
+        # Where we stand now against each holding gives its row of the matrix; on the river the counts are the row
+        board_state = EvalState(board)
+        p1_rank = board_state.extend(self.hand).rank()
+        p2_ranks = rank_array(self.holdings[rows], board_state)
+        standing = np.where(p1_rank > p2_ranks, AHEAD, np.where(p1_rank == p2_ranks, TIED, BEHIND))
+
+        hand_potentials = [[0] * 3 for _ in range(3)]
+        for i in (AHEAD, TIED, BEHIND):
+            weighted = (live[rows][standing == i, None] * counts[standing == i]).sum(axis=0)
+            hand_potentials[i] = [int(value) if weights is None else float(value) for value in weighted]
+        return hand_potentials
+
+    def analysis(self, board, weights=None, opponents: int=1):
+        '''equity.analysis of the hand on a board of this flop'''
+        return analysis(self.matrix(board, weights), opponents)
+
+
+if __name__ == "__main__":
+    from time import time
+    from evaluator import card_ids
+    from batch_eval import hand_strength_counts, HOLDINGS
+    from equity import potential_matrix
+
+    hand, flop = card_ids(['7h', '9h']), card_ids(['8h', '6c', '4h'])
+    session = EquitySession(hand, flop)
+    started = time()
+    matrix = session.matrix(flop)
+    print(f'Flop enumerated in {time() - started:.3f}s')
+
+    assert matrix == potential_matrix(hand, flop)
+    for turn in card_ids(['Kd', '5s', '4c']):
+        assert session.matrix(flop + [turn]) == potential_matrix(hand, flop + [turn])
+
+    river = flop + card_ids(['Kd', '2s'])
+    win, tie, loss = hand_strength_counts(hand, river)
+    assert session.matrix(river) == [[win, 0, 0], [0, tie, 0], [0, 0, loss]]
+
+    weights = np.random.default_rng(0).random(len(HOLDINGS))
+    weighted = session.matrix(flop + card_ids(['Kd']), weights)
+    expected = potential_matrix(hand, flop + card_ids(['Kd']), weights=weights)
+    assert all(abs(a - b) < 1e-6 for row, other in zip(weighted, expected) for a, b in zip(row, other))
+
+    started = time()
+    stats = session.analysis(flop + card_ids(['Kd']))
+    print(f'Turn answered in {time() - started:.4f}s')
+    assert 0 < stats['ehs'] < 1
+
+    print('All tests passed.')
@@ -0,0 +1,216 @@
+'''Persistent memo of equity results, shared by every bot process and kept from one session to the next.
+
+Results are keyed by what was computed (e.g. 'potentials'), the suit-isomorphic class of the hole cards and board
+(hand_index), and the number of opponents, so a spot is computed once for all its suit permutations. They live in
+an SQLite file in WAL mode, which lets several processes read while one writes; writers wait for each other up to
+TIMEOUT seconds. Each process also keeps the memory_entries it used last in memory, as JSON so that callers get
+their own copy, starting with the most recently used ones of the file. Writes, and the use times of hits, are
+buffered and written FLUSH_EVERY at a time. The file holds at most max_entries results: the least recently used ones
+are evicted beyond that.
+
+The store of the process is at STORE_PATH unless configure points it elsewhere, e.g. ':memory:' for self-tests that
+must leave the file alone. Only results that depend on nothing but the spot belong here, e.g. not those against a
+weighted opponent range.'''
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from hand_index import hand_index
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'equity_store.sqlite')
+MAX_ENTRIES = 1000000
+MEMORY_ENTRIES = 100000
+FLUSH_EVERY = 64
+TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+_store = None
+_path = STORE_PATH
+
+
+class EquityStore():
+    '''Memo of JSON-serializable results, see the module docstring'''
+    def __init__(self, path: str=STORE_PATH, max_entries: int=MAX_ENTRIES, memory_entries: int=MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.connection = sqlite3.connect(path, timeout=TIMEOUT, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS memo (
+            kind TEXT, street INTEGER, spot INTEGER, opponents INTEGER, value TEXT, used REAL,
+            PRIMARY KEY (kind, street, spot, opponents)) WITHOUT ROWID''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS memo_used ON memo (used)')
+
+        self.memory = OrderedDict()     # Least recently used first
+        self.pending = {}               # Key: (JSON value, time used) to write
+        self.hits = self.misses = 0
+        self.warm()
+
+    @staticmethod
+    def key(kind: str, hand, board, opponents: int):
+        board = list(board)
+        return kind, len(board), hand_index(list(hand) + board), opponents
+
+    def warm(self):
+        '''Loads the most recently used entries of the file into memory'''
+        rows = self.connection.execute('SELECT kind, street, spot, opponents, value FROM memo ORDER BY used DESC LIMIT ?',
+                                       (self.memory_entries,)).fetchall()
+        for kind, street, spot, opponents, value in reversed(rows):
+            self.memory[kind, street, spot, opponents] = value
+        return len(rows)
+
+    def remember(self, key, value):
+        '''Keeps an entry in memory as the most recently used one, forgetting the least recently used beyond the cap'''
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, kind: str, hand, board, opponents: int=1):
+        '''Stored result for hole cards and a board, lists of card ids, or None'''
+        key = self.key(kind, hand, board, opponents)
+        value = self.memory.get(key)
+        if value is None:
+            # Another process may have stored it since the store was opened
+            row = self.connection.execute('SELECT value FROM memo WHERE kind = ? AND street = ? AND spot = ? AND opponents = ?',
+                                          key).fetchone()
+            if row is not None:
+                value = row[0]
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.remember(key, value)
+        self.buffer(key, value)
+        return json.loads(value)
+
+    def put(self, kind: str, hand, board, opponents: int, value):
+        key = self.key(kind, hand, board, opponents)
+        self.remember(key, json.dumps(value))
+        self.buffer(key, self.memory[key])
+
+    def memo(self, kind: str, hand, board, opponents: int, compute):
+        '''Stored result if there is one, else compute() stored'''
+        value = self.get(kind, hand, board, opponents)
+        if value is None:
+            value = compute()
+            self.put(kind, hand, board, opponents, value)
+        return value
+
+    def buffer(self, key, value):
+        self.pending[key] = (value, time.time())
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        '''Writes the buffered entries and use times, then evicts the least recently used entries over the cap'''
+        if not self.pending: return
+        rows = [key + (value, used) for key, (value, used) in self.pending.items()]
+        self.pending = {}
+
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany('INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?, ?, ?)', rows)
+            excess = self.connection.execute('SELECT COUNT(*) FROM memo').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.connection.execute('DELETE FROM memo WHERE (kind, street, spot, opponents) IN '
+                                        '(SELECT kind, street, spot, opponents FROM memo ORDER BY used LIMIT ?)', (excess,))
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'in_memory': len(self.memory)}
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def configure(path: str=STORE_PATH):
+    '''Makes the store of this process the one at path from now on, ':memory:' for one that is not kept'''
+    global _path
+    close()
+    _path = path
+
+def store():
+    '''Returns the store of this process, opening it on first use. It is flushed and closed when the process exits.'''
+    global _store
+    if _store is None:
+        _store = EquityStore(_path)
+        atexit.register(close)
+        logger.info('equity store: %d entries loaded from %s', len(_store.memory), _store.path)
+    return _store
+
+def close():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+    atexit.unregister(close)
+
+def log_stats():
+    '''Logs the hit rate of the store so far, for the bot logs'''
+    if _store is not None:
+        stats = _store.stats()
+        logger.info('equity store: %d hits, %d misses, hit rate %.1f%%, %d entries in memory', stats['hits'],
+                    stats['misses'], 100 * stats['hit_rate'], stats['in_memory'])
+
+
+if __name__ == "__main__":
+    import tempfile
+    from evaluator import card_ids
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'store.sqlite')
+        first, second = EquityStore(path, max_entries=3), EquityStore(path, max_entries=3)
+
+        hand, board = card_ids(['7h', '9h']), card_ids(['8h', '6c', '4h'])
+        matrix = [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+        assert first.memo('potentials', hand, board, 1, lambda: matrix) == matrix
+        assert first.get('potentials', card_ids(['7s', '9s']), card_ids(['8s', '6d', '4s'])) == matrix
+        assert first.get('potentials', hand, board, 2) is None
+        first.get('potentials', hand, board)[0][0] = 0
+        assert first.get('potentials', hand, board) == matrix
+        assert first.stats()['hits'] == 3 and first.stats()['misses'] == 2
+
+        # Seen by the other process once written, and by new processes on startup
+        assert second.get('potentials', hand, board) is None
+        first.flush()
+        assert second.get('potentials', hand, board) == matrix
+        assert EquityStore(path).memory
+
+        # The least recently used entries go first
+        for opponents in range(2, 5):
+            first.put('win', hand, board, opponents, opponents / 10)
+            first.flush()
+        assert first.connection.execute('SELECT COUNT(*) FROM memo').fetchone()[0] == 3
+        warm = EquityStore(path)
+        assert warm.get('potentials', hand, board) is None and warm.get('win', hand, board, 4) == 0.4
+
+        # Memory keeps only the most recently used entries, the file still has the others
+        small = EquityStore(path, memory_entries=2)
+        assert list(small.memory) == [small.key('win', hand, board, 3), small.key('win', hand, board, 4)]
+        small.put('win', hand, board, 5, 0.5)
+        assert len(small.memory) == 2 and small.key('win', hand, board, 3) not in small.memory
+        assert small.get('win', hand, board, 3) == 0.3 and len(small.memory) == 2
+
+        for opened in (first, second, warm, small):
+            opened.close()
+
+    configure(':memory:')
+    store().put('win', hand, board, 2, 0.2)
+    assert store().get('win', hand, board, 2) == 0.2
+    configure()
+    assert _path == STORE_PATH and _store is None
+
+    print('All tests passed.')
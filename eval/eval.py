@@ -3,77 +3,55 @@ from time import time
 
 from .cards import *
 from .game import *
+from evaluator import EvalState, mask_of, ids_of, FULL_DECK
+from batch_eval import holding_index
+from rank_cache import cache
+from hand_index import hand_index
+from equity import HandEquity, AHEAD, anytime_potentials, river_equity
+import equity_store
 
 from random import sample
 
-class eval():
-    def __init__(self, hand, board_cards):
+class eval(HandEquity):
+    '''HandEquity of hole cards and a board given as lists of card names, e.g. ['As', '8h']'''
+    def __init__(self, hand, board_cards, weights=None):
         d = Deck()
         self.hand = [d.get(c) for c in hand]
         self.board_cards = [d.get(c) for c in board_cards]
+        super().__init__([card.id for card in self.hand], [card.id for card in self.board_cards], weights)
 
-
-    def hand_strength(self):
-        '''Determine the hand strength of your current cards + cards on the board'''
-        p1 = Player('player')
-        p1.receive(self.hand)
-        p1_rank = p1.handEval(self.board_cards)
-
-        d = Deck(shuffle=False, bad_cards=self.hand + self.board_cards)
-        
-        win = tie = loss = 0
-        for i, c1 in enumerate(d.deck):
-            for c2 in d.deck[i+1:]:
-                p2 = Player('opponent')
-                p2.receive([c1, c2])
-                p2_rank = p2.handEval(self.board_cards)
-
-                if p1_rank > p2_rank:
-                    win += 1
-                elif p1_rank == p2_rank:
-                    tie += 1
-                else:
-                    loss += 1
-        
-        # print(win, tie, loss)
-        return (win + 0.5 * tie) / sum([win, tie, loss])
-    
-    @staticmethod
-    def check_possible_flush(cards):
-        suits = {}
-        for card in cards:
-            suits[card.suit] = suits.get(card.suit, 0) + 1
-
-        return max([suit for suit in suits.values()]) >= 3
+    def index(self):
+        '''Index of the hand and board under suit isomorphism, see hand_index'''
+        return hand_index(self.hand_ids + self.board_ids)
 
     def potential_hand_strength(self, only_ppot=False):
-        start = 0
         '''Compute potential hand strength. look_ahead is an integer that specifies the number of cards to look ahead for. On turn, it should be one, and on flop, it should be 2.'''      
         look_ahead = 5 - len(self.board_cards)
 
         if look_ahead == 0:
             return self.hand_strength()
 
-        p1 = Player('player')
-        p2 = Player('opponent')
+        hand_potentials = self.known_matrix()
+        if hand_potentials is not None:
+            if only_ppot: hand_potentials[AHEAD] = [0, 0, 0]
+            return (sum(row[0] for row in hand_potentials) + sum(row[1] for row in hand_potentials) * 0.5) / sum(map(sum, hand_potentials))
 
-        p1.receive(self.hand)
+        board_state = EvalState(self.board_ids)
+        p1_state = board_state.extend(self.hand_ids)
 
-        p1_rank_5 = p1.handEval(self.board_cards)
-        flush_possible_p1 = eval.check_possible_flush(list(self.hand) + self.board_cards)
+        p1_rank_5 = cache.rank(p1_state)
 
-        d = Deck(shuffle=False, bad_cards=self.hand + self.board_cards)
-        computed_p1_ranks = {}
-        computed_p2_ranks = {}
+        deck = ids_of(FULL_DECK & ~mask_of(self.hand_ids + self.board_ids))
 
         winning = [0, 0, 0]
 
-        for p2_hand in sample(list(combinations(d.deck, 2)), len(list(combinations(d.deck, 2))) // 2):
-            p2.clear_hand()
-            p2.receive(list(p2_hand))
+        p2_hands = list(combinations(deck, 2))
+        for p2_hand in sample(p2_hands, len(p2_hands) // 2):
+            weight = 1 if self.weights is None else self.weights[holding_index(p2_hand)]
+            if weight == 0: continue
 
-            p2_rank_5 = p2.handEval(self.board_cards)
-            flush_possible_p2 = eval.check_possible_flush(list(p2_hand) + self.board_cards)
+            p2_state = board_state.extend(p2_hand)
+            p2_rank_5 = cache.rank(p2_state)
 
             if p1_rank_5 > p2_rank_5:
                 if only_ppot: continue    # ppot does not need cases were we are winning
@@ -84,40 +62,42 @@ class eval():
             else:
                 i = 2           # We are behind
 
-            new_d = Deck(shuffle=False, deck=d.deck, bad_cards=list(p2_hand))
-
-            for new_board_cards in sample(list(combinations(new_d.deck, look_ahead)), len(list(combinations(new_d.deck, look_ahead))) // 2):
-                predicted_board_cards = self.board_cards + list(new_board_cards)
-
-                start_i = time()
-                hash_p1 = Cards.hash_list(new_board_cards, flush_possible_p1)
-                hash_p2 = Cards.hash_list(p2_hand + new_board_cards, flush_possible_p2)
-                start += time() - start_i
-
-                if hash_p1 in computed_p1_ranks:
-                    p1_rank_7 = computed_p1_ranks[hash_p1]
-                else:
-                    p1_rank_7 = p1.handEval(predicted_board_cards)
-                    computed_p1_ranks[hash_p1] = p1_rank_7
-
-                if hash_p2 in computed_p2_ranks:
-                    p2_rank_7 = computed_p2_ranks[hash_p2]
-                else:
-                    p2_rank_7 = p2.handEval(predicted_board_cards)
-                    computed_p2_ranks[hash_p2] = p2_rank_7
+            new_deck = [card for card in deck if card not in p2_hand]
+            new_boards = list(combinations(new_deck, look_ahead))
 
+            for new_board_cards in sample(new_boards, len(new_boards) // 2):
+                p1_rank_7 = cache.rank_with(p1_state, *new_board_cards)
+                p2_rank_7 = cache.rank_with(p2_state, *new_board_cards)
 
                 if p1_rank_7 > p2_rank_7:
-                    winning[0] += 1
+                    winning[0] += weight
                 elif p1_rank_7 == p2_rank_7:
-                    winning[1] += 1
+                    winning[1] += weight
                 else:
-                    winning[2] += 1
+                    winning[2] += weight
 
 
         return (winning[0] + winning[1] * 0.5) / sum(winning)
 
+    def anytime_potential(self, deadline=None, stderr=None, only_ppot=False, strata=8):
+        '''Same number as potential_hand_strength, estimated until the time.monotonic() deadline or until its standard
+        error is at most stderr, with the opponent holdings stratified into strata groups by their current hand, see
+        equity.anytime_potentials. Returns a dict with the estimate under 'equity', its 'stderr', its 'variance'
+        per sample and the number of 'samples'.'''
+        if len(self.board_cards) == 5:
+            return {'equity': self.hand_strength(), 'stderr': 0.0, 'variance': 0.0, 'samples': sum(self.hand_strength_counts())}
+
+        hand_potentials = self.known_matrix()
+        if hand_potentials is not None:
+            if only_ppot: hand_potentials[AHEAD] = [0, 0, 0]
+            return {'matrix': hand_potentials, 'equity': river_equity(hand_potentials), 'stderr': 0.0, 'variance': 0.0,
+                    'samples': 0}
+
+        return anytime_potentials(self.hand_ids, self.board_ids, deadline, stderr, only_ppot, self.weights, strata=strata)
+
+
 if __name__ == "__main__":
+    equity_store.configure(':memory:')
     d = Deck()
 
     hand = ['As', '8h']
@@ -132,6 +112,8 @@ if __name__ == "__main__":
     # print(e.potential_hand_strength(1))
     # print(e.potential_hand_strength(2, only_ppot=True))
     print(e.potential_hand_strength(2))
+    print(e.band([0.25, 0.45, 0.65, 0.75], confidence=0.99))
 
 
     print(time() - start_ii)
+    print(cache.stats())
@@ -1,6 +1,6 @@
-import json, os
 from .cards import *
 from .stats import Stats
+from evaluator import evaluate, evaluate_cards, rank
 
 # Game States
 PREFLOP = 0
@@ -30,18 +30,6 @@ ONLY_BOTS = 1
 EVERYONE = 2
 
 
-poker_hands = []
-
-dirname = os.path.dirname(__file__)
-
-fp = open(os.path.join(dirname, "poker_hands_5.json"))
-poker_hands.append(json.load(fp))
-fp = open(os.path.join(dirname, "poker_hands_6.json"))
-poker_hands.append(json.load(fp))
-fp = open(os.path.join(dirname, "poker_hands_7.json"))
-poker_hands.append(json.load(fp))
-
-
 class Board():
     def __init__(self):
         self._cards: list[Cards] = []
@@ -69,6 +57,10 @@ class Board():
         '''Returns the list of cards on the board'''
         return self._cards
 
+    def ids(self):
+        '''Returns the ids of the cards on the board'''
+        return [card.id for card in self._cards]
+
     def display(self):
         '''Returns a list containing strings of all cards names on the board.
         A card is False if it is not revealed.'''
@@ -242,7 +234,7 @@ class Table():
         '''Player shows their hand for the final showdown'''
         if (self.state != SHOWDOWN): raise ValueError('Not showdown yet!')
         
-        if (self.winning_player is None or self.winning_player.handEval(self.board.cards()) < player.handEval(self.board.cards())):
+        if (self.winning_player is None or self.winning_player.rank(self.board.ids()) < player.rank(self.board.ids())):
             self.winning_player = player
 
 
@@ -441,54 +433,16 @@ class Player():
             3. Two Pair
             2. Pair
             1. High Card'''
-            
-            def checkFlush(hand: list[Cards]):
-                suits = {}
-
-                for card in hand:
-                    suits[card.suit] = suits.get(card.suit, []) + [card]
-                
-                for cards in suits.values():
-                    if len(cards) >= 5:
-                        return cards
-
-                return False
-            
-            def getOriginalValues(hand: list[Cards], poker_hand: str):
-                values_needed = [int(char, 16) for char in poker_hand]
-
-                original_hand = []
-                for value in values_needed:
-                    for idx, card in enumerate(hand):
-                        if value == card.value:
-                            original_hand.append(hand.pop(idx))
-                            break
+            return evaluate_cards(self.hand() + river)
 
-                return original_hand
+        def evaluate(self, river: list[int]):
+            '''Same as handEval, but takes a list of card ids and returns (int, tuple) where the tuple holds the values of the cards in hand.
+            Does not build any Cards, use this in enumeration loops.'''
+            return evaluate(self.hand_ids() + river)
 
-
-            hand = sorted(self.hand() + river, key=lambda c: c.value)
-
-            converted_hand = ''.join([card.hex_value for card in hand])
-
-            hand_type, poker_hand = poker_hands[len(hand) - 5].get(converted_hand, [HIGH_CARD, None])
-
-            if (hand_type >= FULL_HOUSE):
-                return hand_type, getOriginalValues(hand, poker_hand)
-
-            flush_cards = checkFlush(hand)
-            if (flush_cards):
-                if hand_type == STRAIGHT:
-                    converted_hand = ''.join([card.hex_value for card in flush_cards])
-                    flush_hand_type, flush_poker_hand = poker_hands[len(flush_cards) - 5].get(converted_hand, [HIGH_CARD, None])
-                    if (flush_hand_type == STRAIGHT):
-                        return STRAIGHT_FLUSH + (flush_poker_hand[0] == 'E'), getOriginalValues(hand, flush_poker_hand)
-
-                return FLUSH, flush_cards[:-6:-1]
-
-            if hand_type == HIGH_CARD: return hand_type, hand[:-6:-1] 
-
-            return hand_type, getOriginalValues(hand, poker_hand)
+        def rank(self, river: list[int]):
+            '''Returns the rank of the player hand with a list of card ids, as one int. A better hand has a higher rank.'''
+            return rank(self.hand_ids() + river)
 
         def look(self):
             '''Prints player hand.'''
@@ -498,6 +452,10 @@ class Player():
             '''Returns player hand'''
             return self.__hand
 
+        def hand_ids(self):
+            '''Returns the ids of the cards in the player hand'''
+            return [card.id for card in self.__hand]
+
         def receive(self, cards):
             '''Receives cards in hand.'''
             if isinstance(cards, list):
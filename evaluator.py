@@ -0,0 +1,476 @@
+'''Integer card encoding and hand evaluation.
+
+A card is an int from 0 to 51: id = suit * 13 + rank, where rank 0 is a Two and rank 12 is an Ace,
+and suits follow the order of cards.Deck (Spades, Clubs, Hearts, Diamonds). This is Cards.num - 1.
+A set of cards can also be given as a 52-bit mask (bit id is set for every card in the set), in
+which case bits 13 * suit to 13 * suit + 12 hold the 13-bit rank mask of that suit.'''
+
+import mmap, os, struct, sys
+from array import array
+
+# Hand Types (same values as game.py)
+ROYAL_FLUSH = 10
+STRAIGHT_FLUSH = 9
+FOUR_OF_A_KIND = 8
+FULL_HOUSE = 7
+FLUSH = 6
+STRAIGHT = 5
+THREE_OF_A_KIND = 4
+TWO_PAIR = 3
+PAIR = 2
+HIGH_CARD = 1
+
+
+RANK_CHARS = '23456789TJQKA'
+SUIT_CHARS = 'schd'
+
+FULL_DECK = (1 << 52) - 1
+SUIT_MASK = 0x1FFF
+
+CARD_NAMES = [rank + suit for suit in SUIT_CHARS for rank in RANK_CHARS]
+CARD_IDS = {name: idx for idx, name in enumerate(CARD_NAMES)}
+
+RANK = [idx % 13 for idx in range(52)]
+SUIT = [idx // 13 for idx in range(52)]
+VALUE = [rank + 2 for rank in RANK]             # Same as Cards.value
+BIT = [1 << idx for idx in range(52)]
+QUINARY = [5 ** rank for rank in RANK]          # The sum over a set of cards is a key of its rank multiset
+
+# (rank mask, rank of the highest card) for every straight, from the best one down to the wheel
+STRAIGHTS = [(0x1F << low, low + 4) for low in range(8, -1, -1)] + [(0x100F, 3)]
+
+
+def card_id(name: str):
+    '''Returns the id of a card from its short name, e.g. As'''
+    return CARD_IDS[name]
+
+def card_ids(names):
+    return [CARD_IDS[name] for name in names]
+
+def card_name(card: int):
+    return CARD_NAMES[card]
+
+def mask_of(cards):
+    '''Returns the 52-bit mask of a list of card ids'''
+    mask = 0
+    for card in cards:
+        mask |= BIT[card]
+    return mask
+
+def ids_of(mask: int):
+    '''Returns the card ids set in a 52-bit mask, in increasing order'''
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(low.bit_length() - 1)
+        mask ^= low
+    return cards
+
+def rank_key(cards):
+    '''Key of the ranks of a list of card ids, ignoring suits'''
+    return sum(QUINARY[card] for card in cards)
+
+def hand_key(cards, flush_possible: bool=True):
+    '''Integer counterpart of Cards.hash_list: the mask of the cards, or their negated rank key
+    when no flush is possible (negated so that the two kinds of keys never collide)'''
+    if flush_possible:
+        return mask_of(cards)
+    return -rank_key(cards)
+
+def suit_masks(mask: int):
+    '''Returns the 13-bit rank mask of each suit in a 52-bit mask'''
+    return [(mask >> shift) & SUIT_MASK for shift in (0, 13, 26, 39)]
+
+
+def straight_high(ranks: int):
+    '''Returns the rank of the highest card of the best straight in a rank mask, or -1 if there is none'''
+    for straight, high in STRAIGHTS:
+        if ranks & straight == straight:
+            return high
+    return -1
+
+def _straight_values(high: int):
+    if high == 3:
+        return (5, 4, 3, 2, 14)
+    return tuple(range(high + 2, high - 3, -1))
+
+def _top(ranks: int, n: int):
+    '''Values of the n highest ranks of a rank mask, highest first'''
+    values = []
+    while ranks and len(values) < n:
+        rank = ranks.bit_length() - 1
+        values.append(rank + 2)
+        ranks ^= 1 << rank
+    return values
+
+
+def classify_mask(mask: int):
+    '''Classifies the 5 to 7 cards of a 52-bit mask from first principles.
+    Returns (hand_type, values) where values are the values of the best five cards, most significant first.
+    These tuples compare the same way as the ones returned by Player.handEval. Used to build the rank tables.'''
+    s, c, h, d = suit_masks(mask)
+
+    for suit in (s, c, h, d):
+        if suit.bit_count() >= 5:
+            high = straight_high(suit)
+            if high == 12:
+                return ROYAL_FLUSH, _straight_values(high)
+            if high >= 0:
+                return STRAIGHT_FLUSH, _straight_values(high)
+            return FLUSH, tuple(_top(suit, 5))
+
+    ranks = s | c | h | d
+    quads = s & c & h & d
+    trips = ((s & c & h) | (s & c & d) | (s & h & d) | (c & h & d)) & ~quads
+    pairs = ((s & c) | (s & h) | (s & d) | (c & h) | (c & d) | (h & d)) & ~quads & ~trips
+
+    if quads:
+        quad = quads.bit_length() - 1
+        return FOUR_OF_A_KIND, (quad + 2,) * 4 + tuple(_top(ranks & ~(1 << quad), 1))
+
+    if trips:
+        trip = trips.bit_length() - 1
+        others = (trips & ~(1 << trip)) | pairs
+        if others:
+            pair = others.bit_length() - 1
+            return FULL_HOUSE, (trip + 2,) * 3 + (pair + 2,) * 2
+
+    high = straight_high(ranks)
+    if high >= 0:
+        return STRAIGHT, _straight_values(high)
+
+    if trips:
+        trip = trips.bit_length() - 1
+        return THREE_OF_A_KIND, (trip + 2,) * 3 + tuple(_top(ranks & ~(1 << trip), 2))
+
+    if pairs:
+        top_pairs = _top(pairs, 2)
+        first = top_pairs[0]
+        if len(top_pairs) == 2:
+            second = top_pairs[1]
+            kicker = _top(ranks & ~(1 << (first - 2)) & ~(1 << (second - 2)), 1)
+            return TWO_PAIR, (first, first, second, second) + tuple(kicker)
+        return PAIR, (first, first) + tuple(_top(ranks & ~(1 << (first - 2)), 3))
+
+    return HIGH_CARD, tuple(_top(ranks, 5))
+
+
+
+# --- Rank tables --- #
+# Every 5 to 7 card hand maps to a rank from 1 (7-5-4-3-2) to 7462 (royal flush), equal ranks being equal hands.
+# Flushes are looked up directly by the 13-bit rank mask of the flush suit. Other hands are looked up by their
+# quinary rank key (see QUINARY) through a minimal perfect hash: the key is split into its low 7 ranks and high
+# 6 ranks, the low part is numbered among the low parts with the same number of cards (LO_INDEX) and BASE holds
+# the offset of every (high part, number of cards in the low part) pair.
+# The tables are read from poker_hands.bin (see build_tables.py), which is memory-mapped so that every process on
+# a host shares one copy of it, or built from first principles when the file is missing.
+HAND_COUNT = 7462
+LO_SIZE = 5 ** 7
+HI_SIZE = 5 ** 6
+NOFLUSH_SIZE = 73775                            # Rank multisets of 5, 6 and 7 cards
+
+SUIT_COUNT = [1 << (4 * suit) for suit in SUIT] # Four 4-bit card counters, one per suit
+FLUSH_CHECK = 0x3333                            # Adding this sets bit 4 * suit + 3 of the suits with 5+ cards
+FLUSH_BITS = 0x8888
+RANK_BIT = [1 << rank for rank in RANK]
+
+HAND_TYPE = []                                  # Hand type of every rank
+PATTERN = []                                    # Values of the best five cards of every rank, 5 per rank
+FLUSH_RANKS = []                                # Rank of every 13-bit flush mask, 0 if fewer than 5 cards
+NOFLUSH_RANKS = []                              # Rank of every perfect hash index
+LO_INDEX = []
+LO_CARDS = []
+BASE = []
+SUIT_QUINARY = []                               # Quinary key of every 13-bit rank mask
+
+TABLES_PATH = os.path.join(os.path.dirname(__file__), 'poker_hands.bin')
+TABLES_MAGIC = b'PKHANDS1'
+TABLE_LAYOUT = [('hand_type', 'B'), ('pattern', 'B'), ('flush_ranks', 'H'), ('noflush_ranks', 'H'),
+                ('lo_index', 'H'), ('lo_cards', 'B'), ('base', 'I'), ('suit_quinary', 'Q')]
+
+
+def _quinary_digits(key: int, length: int):
+    digits = []
+    for _ in range(length):
+        key, digit = divmod(key, 5)
+        digits.append(digit)
+    return digits
+
+def _spread(key: int):
+    '''Mask of cards with the ranks of a quinary key, dealt round the suits so that no suit gets more than 2 cards'''
+    mask = 0
+    suit = 0
+    for rank, count in enumerate(_quinary_digits(key, 13)):
+        for _ in range(count):
+            mask |= 1 << (suit * 13 + rank)
+            suit = (suit + 1) % 4
+    return mask
+
+def build_tables():
+    '''Builds the rank tables from first principles. Returns them as a dict of lists.'''
+    lo_cards = [sum(_quinary_digits(lo, 7)) for lo in range(LO_SIZE)]
+    lo_index = [0] * LO_SIZE
+    lo_keys = [[] for _ in range(8)]
+    for lo, cards in enumerate(lo_cards):
+        if cards <= 7:
+            lo_index[lo] = len(lo_keys[cards])
+            lo_keys[cards].append(lo)
+
+    base = [0] * (HI_SIZE * 8)
+    keys = []
+    for hi in range(HI_SIZE):
+        hi_cards = sum(_quinary_digits(hi, 6))
+        for cards in range(8):
+            if 5 <= hi_cards + cards <= 7:
+                base[hi * 8 + cards] = len(keys)
+                keys.extend(hi * LO_SIZE + lo for lo in lo_keys[cards])
+
+    assert len(keys) == NOFLUSH_SIZE
+    hands = [classify_mask(_spread(key)) for key in keys]
+    flush_hands = [classify_mask(ranks) if ranks.bit_count() >= 5 else None for ranks in range(1 << 13)]
+
+    ordered = sorted(set(hands) | set(flush_hands) - {None})
+    assert len(ordered) == HAND_COUNT
+    ranks_of = {hand: idx + 1 for idx, hand in enumerate(ordered)}
+
+    noflush_ranks = [ranks_of[hand] for hand in hands]
+    flush_ranks = [ranks_of.get(hand, 0) for hand in flush_hands]
+
+    return {
+        'hand_type': [0] + [hand_type for hand_type, _ in ordered],
+        'pattern': [0] * 5 + [value for _, values in ordered for value in values],
+        'flush_ranks': flush_ranks,
+        'noflush_ranks': noflush_ranks,
+        'lo_index': lo_index,
+        'lo_cards': lo_cards,
+        'base': base,
+        'suit_quinary': [sum(5 ** rank for rank in range(13) if ranks >> rank & 1) for ranks in range(1 << 13)],
+    }
+
+def save_tables(tables: dict, path: str=TABLES_PATH):
+    '''Writes tables returned by build_tables to a binary file that load can memory-map'''
+    arrays = [array(code, tables[name]) for name, code in TABLE_LAYOUT]
+
+    header = TABLES_MAGIC + sys.byteorder[0].encode() + bytes(7)
+    offset = len(header) + 16 * len(arrays)
+    entries = []
+    for arr in arrays:
+        entries.append(struct.pack('<QQ', offset, len(arr)))
+        offset += -(-len(arr) * arr.itemsize // 8) * 8
+
+    with open(path, 'wb') as fp:
+        fp.write(header + b''.join(entries))
+        for arr in arrays:
+            data = arr.tobytes()
+            fp.write(data + bytes(-len(data) % 8))
+
+def map_tables(path: str=TABLES_PATH):
+    '''Memory-maps a file written by save_tables. Returns the tables as a dict of memoryviews, or None if the
+    file is missing or was written on a machine with another byte order.'''
+    try:
+        with open(path, 'rb') as fp:
+            data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if data[:9] != TABLES_MAGIC + sys.byteorder[0].encode():
+        return None
+
+    view = memoryview(data)
+    tables = {}
+    for idx, (name, code) in enumerate(TABLE_LAYOUT):
+        offset, length = struct.unpack_from('<QQ', data, 16 + 16 * idx)
+        size = array(code).itemsize
+        tables[name] = view[offset:offset + length * size].cast(code)
+    return tables
+
+def load():
+    '''Fills in the rank tables. Called on first use by the rank functions.'''
+    global HAND_TYPE, PATTERN, FLUSH_RANKS, NOFLUSH_RANKS, LO_INDEX, LO_CARDS, BASE, SUIT_QUINARY
+    if NOFLUSH_RANKS: return
+
+    tables = map_tables() or build_tables()
+
+    HAND_TYPE = tables['hand_type']
+    PATTERN = tables['pattern']
+    FLUSH_RANKS = tables['flush_ranks']
+    LO_INDEX = tables['lo_index']
+    LO_CARDS = tables['lo_cards']
+    BASE = tables['base']
+    SUIT_QUINARY = tables['suit_quinary']
+    NOFLUSH_RANKS = tables['noflush_ranks']
+
+
+def noflush_index(key: int):
+    '''Perfect hash of the quinary rank key of 5 to 7 cards'''
+    hi, lo = divmod(key, LO_SIZE)
+    return BASE[(hi << 3) | LO_CARDS[lo]] + LO_INDEX[lo]
+
+def rank(cards):
+    '''Returns the rank of a list of 5 to 7 card ids, from 1 to 7462. A better hand has a higher rank.'''
+    if not NOFLUSH_RANKS: load()
+
+    key = suits = 0
+    for card in cards:
+        key += QUINARY[card]
+        suits += SUIT_COUNT[card]
+
+    flush = (suits + FLUSH_CHECK) & FLUSH_BITS
+    if flush:
+        suit = flush.bit_length() // 4 - 1
+        ranks = 0
+        for card in cards:
+            if SUIT[card] == suit:
+                ranks |= RANK_BIT[card]
+        return FLUSH_RANKS[ranks]
+
+    hi, lo = divmod(key, LO_SIZE)
+    return NOFLUSH_RANKS[BASE[(hi << 3) | LO_CARDS[lo]] + LO_INDEX[lo]]
+
+def rank_mask(mask: int):
+    '''Returns the rank of the 5 to 7 cards of a 52-bit mask. See rank.'''
+    if not NOFLUSH_RANKS: load()
+
+    key = 0
+    for shift in (0, 13, 26, 39):
+        ranks = (mask >> shift) & SUIT_MASK
+        if ranks.bit_count() >= 5:
+            return FLUSH_RANKS[ranks]
+        key += SUIT_QUINARY[ranks]
+
+    hi, lo = divmod(key, LO_SIZE)
+    return NOFLUSH_RANKS[BASE[(hi << 3) | LO_CARDS[lo]] + LO_INDEX[lo]]
+
+def evaluate_ranks(cards):
+    '''Evaluates a list of 5 to 7 card ids by their ranks only, as if they could never make a flush.
+    Returns (hand_type, values), which is what the poker_hands_5/6/7.json tables used to hold.'''
+    if not NOFLUSH_RANKS: load()
+    return describe(NOFLUSH_RANKS[noflush_index(rank_key(cards))])
+
+def evaluate_flush(ranks: int):
+    '''Evaluates the 13-bit rank mask of a suit holding 5 to 7 cards, e.g. from suit_masks.
+    Returns (hand_type, values), the hand type being FLUSH, STRAIGHT_FLUSH or ROYAL_FLUSH.'''
+    if not NOFLUSH_RANKS: load()
+    return describe(FLUSH_RANKS[ranks])
+
+def hand_type(rank: int):
+    '''Returns the hand type (ROYAL_FLUSH ... HIGH_CARD) of a rank'''
+    if not NOFLUSH_RANKS: load()
+    return HAND_TYPE[rank]
+
+def describe(rank: int):
+    '''Returns (hand_type, values) for a rank, as classify_mask would'''
+    if not NOFLUSH_RANKS: load()
+    return HAND_TYPE[rank], tuple(PATTERN[5 * rank:5 * rank + 5])
+
+
+class EvalState():
+    '''Partial evaluation of a set of cards. Cards are added one at a time, and the rank can be read once there are 5 to 7.
+    A state is never modified in place: add returns a new state, so the state of a board can be computed once and
+    extended by every hand and runout that shares it. batch_eval.rank_array also takes a state as a prefix.'''
+    __slots__ = ('key', 'suits', 'mask', 'size')
+
+    def __init__(self, cards=()):
+        self.key = self.suits = self.mask = self.size = 0
+        for card in cards:
+            self.key += QUINARY[card]
+            self.suits += SUIT_COUNT[card]
+            self.mask |= BIT[card]
+            self.size += 1
+
+    def __repr__(self):
+        return f'EvalState({[CARD_NAMES[card] for card in ids_of(self.mask)]})'
+
+    def __len__(self):
+        return self.size
+
+    def add(self, card: int):
+        '''Returns the state with one more card'''
+        state = EvalState.__new__(EvalState)
+        state.key = self.key + QUINARY[card]
+        state.suits = self.suits + SUIT_COUNT[card]
+        state.mask = self.mask | BIT[card]
+        state.size = self.size + 1
+        return state
+
+    def extend(self, cards):
+        '''Returns the state with all of cards added'''
+        state = self
+        for card in cards:
+            state = state.add(card)
+        return state
+
+    def rank(self):
+        '''Rank of the cards of the state, which must hold 5 to 7 cards'''
+        return self.rank_with()
+
+    def rank_with(self, *cards):
+        '''Rank of the cards of the state plus cards, without building the intermediate states'''
+        if not NOFLUSH_RANKS: load()
+
+        key, suits, mask = self.key, self.suits, self.mask
+        for card in cards:
+            key += QUINARY[card]
+            suits += SUIT_COUNT[card]
+            mask |= BIT[card]
+
+        flush = (suits + FLUSH_CHECK) & FLUSH_BITS
+        if flush:
+            return FLUSH_RANKS[(mask >> (13 * (flush.bit_length() // 4 - 1))) & SUIT_MASK]
+
+        hi, lo = divmod(key, LO_SIZE)
+        return NOFLUSH_RANKS[BASE[(hi << 3) | LO_CARDS[lo]] + LO_INDEX[lo]]
+
+
+def evaluate(cards):
+    '''Evaluates a list of 5 to 7 card ids. See evaluate_mask.'''
+    return describe(rank(cards))
+
+def evaluate_mask(mask: int):
+    '''Evaluates the 5 to 7 cards of a 52-bit mask.
+    Returns (hand_type, values) where values are the values of the best five cards, most significant first.
+    These tuples compare the same way as the ones returned by Player.handEval, but comparing ranks is faster.'''
+    return describe(rank_mask(mask))
+
+def best_five(cards):
+    '''Returns the ids of the best five cards of a list of 5 to 7 card ids, most significant first. Used for display.'''
+    hand_rank = rank(cards)
+    hand_type, values = describe(hand_rank)
+
+    left = list(cards)
+    if hand_type in (FLUSH, STRAIGHT_FLUSH, ROYAL_FLUSH):
+        suits = [SUIT[card] for card in left]
+        flush_suit = max(set(suits), key=suits.count)
+        left = [card for card in left if SUIT[card] == flush_suit]
+
+    best = []
+    for value in values:
+        for idx, card in enumerate(left):
+            if VALUE[card] == value:
+                best.append(left.pop(idx))
+                break
+    return best
+
+def evaluate_cards(cards):
+    '''Evaluates a list of 5 to 7 card objects with an id attribute, e.g. cards.Cards.
+    Returns (hand_type, best five cards), the cards most significant first. This is what Player.handEval returns.'''
+    ids = [card.id for card in cards]
+    best = best_five(ids)
+    return HAND_TYPE[rank(best)], [cards[ids.index(card)] for card in best]
+
+
+if __name__ == "__main__":
+    assert evaluate(card_ids(['As', 'Ks', 'Qs', 'Js', 'Ts'])) == (ROYAL_FLUSH, (14, 13, 12, 11, 10))
+    assert evaluate(card_ids(['As', '2d', '3s', '4h', '5c', 'Kd', 'Kh'])) == (STRAIGHT, (5, 4, 3, 2, 14))
+    assert evaluate(card_ids(['9s', '9h', '9d', '4c', '4d', '4h', 'Ts'])) == (FULL_HOUSE, (9, 9, 9, 4, 4))
+    assert evaluate(card_ids(['2d', '6s', 'Kh', 'Qd', 'Ad', 'Ks', 'Td'])) == (PAIR, (13, 13, 14, 12, 10))
+    assert ids_of(mask_of([0, 13, 51])) == [0, 13, 51]
+    assert rank(card_ids(['As', 'Ks', 'Qs', 'Js', 'Ts'])) == HAND_COUNT
+    assert rank(card_ids(['7d', '5s', '4s', '3h', '2s'])) == 1
+    assert rank(card_ids(['Ah', 'Ad', 'Kc', 'Ks', '3d', '7h', '7c'])) == rank_mask(mask_of(card_ids(['Ah', 'Ad', 'Kc', 'Ks', '3d', '7h', '7c'])))
+    state = EvalState(card_ids(['Ah', 'Kh', '7h']))
+    assert state.add(card_id('2h')).rank_with(card_id('3h'), card_id('Ad')) == rank(card_ids(['Ah', 'Kh', '7h', '2h', '3h', 'Ad']))
+    assert [card_name(card) for card in best_five(card_ids(['9s', '9h', '9d', '4c', '4d', '4h', 'Ts']))] == ['9s', '9h', '9d', '4c', '4d']
+    assert evaluate_flush(suit_masks(mask_of(card_ids(['5h', '4h', '3h', '2h', 'Ah', 'Kh'])))[2]) == (STRAIGHT_FLUSH, (5, 4, 3, 2, 14))
+
+    print('All tests passed.')
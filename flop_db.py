@@ -0,0 +1,68 @@
+'''Flop equity database: the potentials matrix (see equity.py) of every (hole cards, flop) class of hand_index,
+against one random opponent holding with both turn and river to come.
+
+The database is an (N, 9) float32 .npy file of about 46 MB, one row per class holding the matrix as fractions of its
+total, each within TOLERANCE of the exact fraction, and is memory-mapped on first use. Rows that are not built yet
+are NaN, so a partially built database can be used: lookup returns None for them, as it does when there is no
+database at all. Build it with build_flop_db.py.'''
+import os
+
+import numpy as np
+
+from hand_index import hand_index, street_size
+
+FLOP_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flop_equity.npy')
+FLOP = 1
+TOLERANCE = 1e-7        # Largest rounding error of a float32 fraction, at most 2 ** -24 below 1
+
+_db = None
+
+
+def create(path: str=FLOP_DB_PATH):
+    '''Creates an empty database, every row NaN'''
+    db = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(street_size(FLOP), 9))
+    db[:] = np.nan
+    db.flush()
+    return db
+
+def database():
+    '''Returns the memory-mapped database, or None if there is none'''
+    global _db
+    if _db is None:
+        _db = np.load(FLOP_DB_PATH, mmap_mode='r') if os.path.exists(FLOP_DB_PATH) else False
+    return _db if _db is not False else None
+
+def lookup(hand, board):
+    '''Potentials matrix of a hand on a flop, both lists of card ids, as fractions of the total,
+    or None if it is not in the database'''
+    db = database()
+    if db is None: return None
+
+    row = db[hand_index(list(hand) + list(board))].astype(np.float64)
+    if np.isnan(row[0]): return None
+    return row.reshape(3, 3).tolist()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from build_flop_db import build_rows
+    from equity import potential_matrix
+    from hand_index import hand_unindex
+
+    # Rows built into a scratch database read back within TOLERANCE of the exact enumeration
+    with tempfile.TemporaryDirectory() as directory:
+        FLOP_DB_PATH = os.path.join(directory, 'flop_equity.npy')
+        create(FLOP_DB_PATH)
+        indices = [0, 1, street_size(FLOP) // 2, street_size(FLOP) - 1]
+        for index in indices:
+            assert build_rows(FLOP_DB_PATH, index, index + 1) == 1
+
+        for index in indices:
+            cards = hand_unindex(FLOP, index)
+            exact = np.array(potential_matrix(cards[:2], cards[2:]), dtype=np.float64)
+            assert np.abs(np.array(lookup(cards[:2], cards[2:])) - exact / exact.sum()).max() <= TOLERANCE
+        missing = hand_unindex(FLOP, 2)
+        assert lookup(missing[:2], missing[2:]) is None
+        _db = None
+
+    print('All tests passed.')
@@ -0,0 +1,248 @@
+'''Hand isomorphism: maps hole cards plus board to a dense index, the same for hands that only differ by a
+permutation of the suits, with the inverse mapping.
+
+Each suit of a hand has a configuration, the number of its cards dealt in each round, and an index, the ranks
+dealt in each round given the ranks dealt before. A hand is the multiset of the (configuration, index) of its 4
+suits. Hands are numbered configuration by configuration, and within one, suits with equal configurations are
+interchangeable, so their indices are numbered as a multiset. The representative of a class gives suits 0 to 3
+(Spades, Clubs, Hearts, Diamonds) to the suits in decreasing (configuration, index) order.'''
+from bisect import bisect_right
+from itertools import accumulate, permutations, product
+from math import comb
+
+import numpy as np
+
+from cards import Deck, Cards
+from evaluator import CARD_NAMES
+
+SUITS = 4
+RANKS = 13
+
+
+def suit_size(config: tuple):
+    '''Number of ways to deal the cards of one suit with this configuration'''
+    size, used = 1, 0
+    for count in config:
+        size *= comb(RANKS - used, count)
+        used += count
+    return size
+
+def suit_index(masks: list[int]):
+    '''Index of the ranks dealt in one suit, given as one 13-bit rank mask per round'''
+    index, multiplier, used = 0, 1, 0
+    for mask in masks:
+        digit, nth, left = 0, 1, mask
+        while left:
+            rank = (left & -left).bit_length() - 1
+            digit += comb(rank - (used & ((1 << rank) - 1)).bit_count(), nth)
+            nth += 1
+            left &= left - 1
+
+        index += digit * multiplier
+        multiplier *= comb(RANKS - used.bit_count(), mask.bit_count())
+        used |= mask
+    return index
+
+def suit_unindex(config: tuple, index: int):
+    '''Inverse of suit_index: the rank mask of every round of a suit with this configuration'''
+    masks, used = [], 0
+    for count in config:
+        radix = comb(RANKS - used.bit_count(), count)
+        index, digit = divmod(index, radix)
+
+        free = [rank for rank in range(RANKS) if not used >> rank & 1]
+        mask = 0
+        for nth in range(count, 0, -1):
+            position = nth - 1
+            while comb(position + 1, nth) <= digit:
+                position += 1
+            digit -= comb(position, nth)
+            mask |= 1 << free[position]
+
+        masks.append(mask)
+        used |= mask
+    return masks
+
+def groups(config: tuple):
+    '''(start, end) of the runs of equal suit configurations in a sorted configuration'''
+    start = 0
+    while start < SUITS:
+        end = start + 1
+        while end < SUITS and config[end] == config[start]:
+            end += 1
+        yield start, end
+        start = end
+
+
+class HandIndexer():
+    '''Indexes hands dealt over several rounds, by default hole cards, flop, turn and river.
+    The index of round r covers the cards of rounds 0 to r and goes from 0 to size(r) - 1.'''
+    def __init__(self, cards_per_round=(2, 3, 1, 1)):
+        self.cards_per_round = tuple(cards_per_round)
+        self.totals = list(accumulate(self.cards_per_round))
+        self.configs = []       # Sorted configurations of each round
+        self.offsets = []       # First index of each configuration of each round, then the size of the round
+        self.positions = []     # Position of each configuration in configs
+
+        configs = {((),) * SUITS}
+        for cards in self.cards_per_round:
+            splits = [split for split in product(range(cards + 1), repeat=SUITS) if sum(split) == cards]
+            configs = {tuple(sorted((suit + (count,) for suit, count in zip(config, split)), reverse=True))
+                       for config in configs for split in splits
+                       if all(sum(suit) + count <= RANKS for suit, count in zip(config, split))}
+
+            ordered = sorted(configs, reverse=True)
+            self.configs.append(ordered)
+            self.offsets.append(list(accumulate((self.config_size(config) for config in ordered), initial=0)))
+            self.positions.append({config: idx for idx, config in enumerate(ordered)})
+
+    @staticmethod
+    def config_size(config: tuple):
+        size = 1
+        for start, end in groups(config):
+            size *= comb(suit_size(config[start]) + end - start - 1, end - start)
+        return size
+
+    def size(self, round: int):
+        '''Number of classes of hands in a round'''
+        return self.offsets[round][-1]
+
+    def round(self, cards):
+        '''Round of a list of cards, from its length'''
+        return self.totals.index(len(cards))
+
+    def index(self, cards):
+        '''Index of a list of card ids, the cards of the first round first, e.g. hole cards then board'''
+        rounds = self.round(cards) + 1
+        masks = [[0] * rounds for _ in range(SUITS)]
+        start = 0
+        for round, end in enumerate(self.totals[:rounds]):
+            for card in cards[start:end]:
+                masks[card // RANKS][round] |= 1 << (card % RANKS)
+            start = end
+
+        suits = sorted(((tuple(mask.bit_count() for mask in suit), suit_index(suit)) for suit in masks), reverse=True)
+        config = tuple(suit[0] for suit in suits)
+
+        index, multiplier = 0, 1
+        for start, end in groups(config):
+            size = end - start
+            index += multiplier * sum(comb(suits[start + nth][1] + size - 1 - nth, size - nth) for nth in range(size))
+            multiplier *= comb(suit_size(config[start]) + size - 1, size)
+
+        return self.offsets[rounds - 1][self.positions[rounds - 1][config]] + index
+
+    def unindex(self, round: int, index: int):
+        '''Canonical list of card ids of an index, the cards of each round sorted'''
+        round %= len(self.totals)
+        position = bisect_right(self.offsets[round], index) - 1
+        config = self.configs[round][position]
+        index -= self.offsets[round][position]
+
+        dealt = [[] for _ in range(round + 1)]
+        for start, end in groups(config):
+            size = end - start
+            radix = comb(suit_size(config[start]) + size - 1, size)
+            index, group_index = divmod(index, radix)
+
+            for nth in range(size):
+                value = size - nth - 1
+                while comb(value + 1, size - nth) <= group_index:
+                    value += 1
+                group_index -= comb(value, size - nth)
+
+                suit = start + nth
+                for cards, mask in zip(dealt, suit_unindex(config[suit], value - (size - 1 - nth))):
+                    cards.extend(suit * RANKS + rank for rank in range(RANKS) if mask >> rank & 1)
+
+        return [card for cards in dealt for card in sorted(cards)]
+
+
+# One indexer per street, with the board as a single round since the order it was dealt in does not matter
+BOARD_SIZES = [0, 3, 4, 5]
+indexers = [HandIndexer((2, board) if board else (2,)) for board in BOARD_SIZES]
+
+
+def street_size(street: int):
+    '''Number of classes of a street, 0 for preflop to 3 for the river'''
+    return indexers[street].size(-1)
+
+def hand_index(cards):
+    '''Index of a list of card ids, the 2 hole cards then 0, 3, 4 or 5 board cards'''
+    return indexers[BOARD_SIZES.index(len(cards) - 2)].index(cards)
+
+def hand_unindex(street: int, index: int):
+    '''Canonical card ids of an index of a street, the hole cards then the board'''
+    return indexers[street].unindex(-1, index)
+
+def index_hand(hand: list[Cards], board: list[Cards]=[]):
+    '''Index of hole cards and a board of 0, 3, 4 or 5 cards'''
+    return hand_index([card.id for card in hand + board])
+
+def unindex_hand(street: int, index: int):
+    '''Representative (hand, board) of an index of a street, as cards'''
+    cards = [Deck.get(CARD_NAMES[card]) for card in hand_unindex(street, index)]
+    return cards[:2], cards[2:]
+
+
+def suit_symmetries(*groups):
+    '''Suit permutations that map each group of card ids onto itself, e.g. the hero hand and the board, as an (S, 52)
+    array whose rows map card ids to card ids. The identity comes first.'''
+    signature = [tuple(sum(1 << (card % RANKS) for card in group if card // RANKS == suit) for group in groups)
+                 for suit in range(SUITS)]
+    maps = [[perm[card // RANKS] * RANKS + card % RANKS for card in range(SUITS * RANKS)]
+            for perm in permutations(range(SUITS)) if all(signature[perm[suit]] == signature[suit] for suit in range(SUITS))]
+    return np.array(maps, dtype=np.int64)
+
+def canonical(items, symmetries, values=None):
+    '''Groups the rows of an (N, k) array of card ids that one of the symmetries maps onto each other, and that have
+    the same value if an (N,) array of values is given, e.g. weights.
+    Returns (rows, counts): the index of the first row of each group, and the number of rows in it.'''
+    items = np.asarray(items, dtype=np.int64)
+    if len(symmetries) == 1:
+        return np.arange(len(items)), np.ones(len(items), dtype=np.int64)
+
+    keys = None
+    for symmetry in symmetries:
+        image = np.sort(symmetry[items], axis=1)
+        key = (image * (SUITS * RANKS) ** np.arange(image.shape[1])).sum(axis=1)
+        keys = key if keys is None else np.minimum(keys, key)
+
+    if values is not None:
+        keys = np.column_stack([keys, np.asarray(values, dtype=np.float64).view(np.int64)])
+    _, rows, counts = np.unique(keys, axis=0 if values is not None else None, return_index=True, return_counts=True)
+    return rows, counts
+
+if __name__ == "__main__":
+    from itertools import combinations
+    from random import sample, randrange, shuffle
+
+    assert [street_size(street) for street in range(4)] == [169, 1286792, 13960050, 123156254]
+    assert len({hand_index(list(cards)) for cards in combinations(range(52), 2)}) == 169
+    assert HandIndexer((2, 3, 1, 1)).size(3) == 2428287420
+
+    for _ in range(2000):
+        street = randrange(4)
+        cards = sample(range(52), 2 + BOARD_SIZES[street])
+        index = hand_index(cards)
+        assert hand_index(hand_unindex(street, index)) == index
+
+        suits = list(range(SUITS))
+        shuffle(suits)
+        assert hand_index([suits[card // RANKS] * RANKS + card % RANKS for card in cards[1::-1] + cards[:1:-1]]) == index
+
+        index = randrange(street_size(street))
+        assert hand_index(hand_unindex(street, index)) == index
+
+    symmetries = suit_symmetries([6, 19], [32])     # 8s 8c, board 8h: spades and clubs swap, hearts and diamonds don't
+    assert len(symmetries) == 2 and (symmetries[0] == np.arange(52)).all()
+    rows, counts = canonical(list(combinations([card for card in range(52) if card not in (6, 19, 32)], 2)), symmetries)
+    assert counts.sum() == 1176 and len(rows) < 1176
+    weighted_rows, _ = canonical(list(combinations([card for card in range(52) if card not in (6, 19, 32)], 2)), symmetries,
+                                 np.arange(1176) % 2)
+    assert len(rows) < len(weighted_rows) < 1176
+
+    hand, board = unindex_hand(1, index_hand([Deck.get('Ah'), Deck.get('Kh')], [Deck.get('2h'), Deck.get('Td'), Deck.get('Ts')]))
+    assert [card.shortName for card in hand + board] == ['Ks', 'As', '2s', 'Tc', 'Th']
+
+    print('All tests passed.')
@@ -2,11 +2,15 @@
 import asyncio
 from typing import Tuple
 import argparse
-import treys
+import logging
 import time
 
 from tg.bot import Bot
 import tg.types as pokerTypes
+from evaluator import card_ids
+import montecarlo
+import preflop
+import equity_store
 
 parser = argparse.ArgumentParser(
     prog='Template bot',
@@ -18,7 +22,12 @@ parser.add_argument('--host', type=str, default='localhost',
                     help='The host to connect to the server on')
 parser.add_argument('--room', type=str, default='my-new-room',
                     help='The room to connect to')
-parser.add_argument('--simulations', type=int, default=1000)
+parser.add_argument('--simulations', type=int, default=1000000,
+                    help='Most deals simulated per decision')
+parser.add_argument('--time-limit', type=float, default=1.0,
+                    help='Seconds to spend simulating per decision')
+parser.add_argument('--stderr', type=float, default=0.002,
+                    help='Stop simulating once the standard error of the win probability is this low')
 parser.add_argument('--username', type=str, default='bot',
                     help='The username for this bot (make sure it\'s unique)')
 
@@ -72,36 +81,29 @@ class KellyCriterion(Bot):
 
     def game_over(self, payouts):
         print('game over', payouts)
-        pass
+        equity_store.log_stats()
 
     def start_game(self, my_id):
         self.my_id = my_id
         print('start game', my_id)
 
     def win_prob(self, state: pokerTypes.PokerSharedState, hand: Tuple[pokerTypes.Card, pokerTypes.Card]):
-        out = 0
-        hand = [
-            treys.Card.new(card_name(hand[0])),
-            treys.Card.new(card_name(hand[1]))]
-        board = [treys.Card.new(card_name(card)) for card in state.cards]
-        evaluator = treys.Evaluator()
-        for i in range(args.simulations):
-            deck = treys.Deck()
-            deck.shuffle()
-            for card in hand+board:
-                deck.cards.remove(card)
-            pred = board + deck.draw(5-len(board))
-            score = evaluator.evaluate(hand, pred)
-            other = 10**9
-
-            for player in state.players:
-                if player.id != self.my_id:
-                    other = min(other, evaluator.evaluate(deck.draw(2), pred))
-            if score < other:
-                out += 1
-        return out/args.simulations
+        hand = card_ids([card_name(card) for card in hand])
+        board = card_ids([card_name(card) for card in state.cards])
+        opponents = len([player for player in state.players if player.id != self.my_id])
+        if opponents == 0: return 1.0
+
+        if not board and 1 <= opponents <= preflop.MAX_OPPONENTS:
+            prob = preflop.win_prob(hand, opponents)
+            if prob is not None: return prob
+
+        result = montecarlo.stored_equity(hand, board, opponents, time.monotonic() + args.time_limit, args.stderr,
+                                          args.simulations, stratified=True)
+        print('simulated', result['samples'], 'deals, stderr', result['win_stderr'], 'variance', result['variance'])
+        return result['win']
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     bot = KellyCriterion(args.host, args.port, args.room, args.username)
     asyncio.run(bot.start())
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 import asyncio
 import argparse
+import logging
 
 from tg.bot import Bot
 from typing import Dict, Tuple
 
 from websockets.client import connect
 from tg import types, util
+from eval import eval
+import equity_store
 from abc import abstractmethod
 from time import sleep
 
@@ -32,6 +35,20 @@ parser.add_argument('--username', type=str, default='bot',
 args = parser.parse_args()
 
 
+def card_name(card: types.Card):
+    val = str(card.rank)
+    if card.rank == 1:
+        val = 'A'
+    if card.rank == 10:
+        val = 'T'
+    elif card.rank == 11:
+        val = 'J'
+    elif card.rank == 12:
+        val = 'Q'
+    elif card.rank == 13:
+        val = 'K'
+    return f"{val}{card.suit[0]}"
+
 class Loki(Bot):
     # --- Pre-Flop Betting Strategy --- #
     # Income rates for pre-flop. Used to determine what strategy to play
@@ -134,10 +151,10 @@ class Loki(Bot):
         else:
             return Loki.income_rates[temp[0].rank-2][temp[1].rank-2]
 
-    def compute_ppot(self):
-        '''Compute the PPOT of the hand. Used for semi-bluffing''' 
-        a = eval(self.hand(), self.table.board.cards())
-        return a.potential_hand_strength(2, True)[0]
+    def compute_ppot(self, state: types.PokerSharedState, hand: Tuple[types.Card, types.Card]):
+        '''Compute the PPOT of the hand. Used for semi-bluffing. It is 0 before the flop, where it is undefined.''' 
+        if not state.cards: return 0.0
+        return eval.eval([card_name(c) for c in hand], [card_name(c) for c in state.cards]).analysis()['ppot']
 
     # Strategies
     def make0(self, state):
@@ -186,6 +203,7 @@ class Loki(Bot):
 
     def game_over(self, payouts):
         print('game over', payouts)
+        equity_store.log_stats()
 
     def start_game(self, my_id):
         self.my_id = my_id
@@ -216,5 +234,6 @@ class Loki(Bot):
 #         return out/args.simulations
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     bot = Loki("ws.turingpoker.com", "80", args.room, args.username)
     asyncio.run(bot.start())
\ No newline at end of file
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import asyncio
 import argparse
+import logging
 
 from tg.bot import Bot
 from typing import Dict, Tuple
@@ -8,9 +9,11 @@ from typing import Dict, Tuple
 from websockets.client import connect
 from tg import types, util
 from eval import eval, cards
+import equity_store
 
 
-import treys
+import montecarlo
+from evaluator import card_ids
 import asyncio
 import argparse
 
@@ -28,6 +31,8 @@ parser.add_argument('--room', type=str, default='my-new-room',
                     help='The room to connect to')
 parser.add_argument('--username', type=str, default='bot',
                     help='The username for this bot (make sure it\'s unique)')
+parser.add_argument('--confidence', type=float, default=0.99,
+                    help='Confidence at which the side of the pot odds the EHS falls on is settled, 1 to only settle it for sure')
 
 args = parser.parse_args()
 
@@ -103,15 +108,22 @@ class Loki(Bot):
     
         e = eval.eval([card_name(c) for c in hand], [card_name(c) for c in state.cards])
 
-        ehs = e.potential_hand_strength()
-
         me = [p for p in state.players if p.id == "l3"][0]
 
 
         print(state.target_bet)
         raise_amount = state.target_bet - me.current_bet
 
-        print(ehs)
+        # Only which side of the pot odds the EHS falls on matters, so stop computing it once that is settled
+        thresholds = sorted({raise_amount / (state.pot + raise_amount), raise_amount * 2 / (state.pot + raise_amount * 2)})
+        result = e.band(thresholds, args.confidence if args.confidence < 1 else None)
+        if result['band'] is None:
+            # Not settled: only pay for what the EHS is sure to be worth
+            ehs = result['bounds'][0]
+            print(ehs, result['bounds'], 'band not settled')
+        else:
+            ehs = result['equity']
+            print(ehs, result['bounds'])
 
         if ehs >= raise_amount * 2 / (state.pot + raise_amount * 2):
             return self.make2(state)
@@ -148,10 +160,10 @@ class Loki(Bot):
         else:
             return Loki.income_rates[temp[0].rank-2][temp[1].rank-2]
 
-    def compute_ppot(self):
-        '''Compute the PPOT of the hand. Used for semi-bluffing''' 
-        a = eval(self.hand(), self.table.board.cards())
-        return a.potential_hand_strength(2, True)[0]
+    def compute_ppot(self, state: types.PokerSharedState, hand: Tuple[types.Card, types.Card]):
+        '''Compute the PPOT of the hand. Used for semi-bluffing. It is 0 before the flop, where it is undefined.''' 
+        if not state.cards: return 0.0
+        return eval.eval([card_name(c) for c in hand], [card_name(c) for c in state.cards]).analysis()['ppot']
 
     # Strategies
     def make0(self, state: types.PokerSharedState):
@@ -204,6 +216,7 @@ class Loki(Bot):
 
     def game_over(self, payouts):
         print('game over', payouts)
+        equity_store.log_stats()
 
     def start_game(self, my_id):
         self.my_id = my_id
@@ -211,29 +224,11 @@ class Loki(Bot):
 
     
     def win_prob(self, state: types.PokerSharedState, hand: Tuple[types.Card, types.Card]):
-        out = 0
-        hand = [
-            treys.Card.new(card_name(hand[0])),
-            treys.Card.new(card_name(hand[1]))]
-        board = [treys.Card.new(card_name(card)) for card in state.cards]
-        evaluator = treys.Evaluator()
-
-        for i in range(10000):
-            deck = treys.Deck()
-            deck.shuffle()
-            for card in hand+board:
-                deck.cards.remove(card)
-            pred = board + deck.draw(5-len(board))
-            score = evaluator.evaluate(hand, pred)
-            other = 10**9
-
-            for player in state.players:
-                if player.id != self.my_id:
-                    other = min(other, evaluator.evaluate(deck.draw(2), pred))
-            if score < other:
-                out += 1
-        return out/10000
+        opponents = len([player for player in state.players if player.id != self.my_id])
+        return montecarlo.stored_equity(card_ids([card_name(card) for card in hand]), card_ids([card_name(card) for card in state.cards]),
+                                        opponents, stderr=0.002, max_samples=100000, stratified=True)['win']
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     bot = Loki("ws.turingpoker.com", "80", args.room, args.username)
     asyncio.run(bot.start())
\ No newline at end of file
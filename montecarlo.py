@@ -0,0 +1,236 @@
+'''Multiway Monte Carlo equity: the chances of a hand against several random opponent holdings, with the rest of
+the board dealt at random.
+
+Deals are drawn in batches from a preallocated (batch, deck) array of card ids, by a partial Fisher-Yates shuffle of
+its first columns, one vectorized swap per dealt card. The rows stay permutations of the deck, so the array is reused
+from batch to batch without being reset. The hands of a batch are ranked with batch_eval.rank_array.
+
+With stratified=True, the first STRATA_CARDS cards dealt to the board, or on the river the first opponent card,
+are not drawn at random but cycle through all their combinations, so that each one comes up equally often. The
+estimates are then stratified by them (see sampling.py), which removes the part of the variance those cards explain,
+e.g. all the variance of our own hand on the flop.
+
+stored_equity keeps the estimates in the equity store, and answers from it when the stored one is precise enough.'''
+import time
+from itertools import combinations
+
+import numpy as np
+
+from evaluator import EvalState, mask_of, ids_of, FULL_DECK
+from batch_eval import rank_array
+from sampling import StratifiedMean, confidence_bounds, band, banded
+import equity_store
+
+DEFAULT_BATCH = 20000
+MIN_SAMPLES = 1000
+STRATA_CARDS = 2
+CONFIDENCE = 0.99
+STDERR_OF = {'equity': 'stderr', 'win': 'win_stderr'}
+
+
+class MonteCarlo():
+    '''Running estimate for hole cards and a board of 0 to 5 cards, both lists of card ids, against opponents
+    random holdings. Call run to deal more samples, and result for the estimate so far.'''
+    def __init__(self, hand, board, opponents: int, batch: int=DEFAULT_BATCH, seed=None, stratified: bool=False):
+        assert opponents >= 1, 'at least one opponent is needed'
+        self.hand, self.board, self.opponents = list(hand), list(board), opponents
+        self.runout = 5 - len(self.board)
+        self.board_state = EvalState(self.board)
+        self.p1_state = self.board_state.extend(self.hand)
+
+        deck = ids_of(FULL_DECK & ~mask_of(self.hand + self.board))
+        assert self.runout + 2 * opponents <= len(deck), 'not enough cards for that many opponents'
+        self.batch = batch
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.arange(batch)
+        self.deck = np.tile(np.array(deck, dtype=np.int64), (batch, 1))
+
+        # Strata: every choice of the first STRATA_CARDS cards dealt, as rows of card ids, in random order so that
+        # the strata sampled before the first full cycle are a random subset
+        forced = min(STRATA_CARDS, self.runout) or 1 if stratified else 0
+        self.strata = self.rng.permutation(np.array(list(combinations(deck, forced)), dtype=np.int64))
+        self.next_stratum = 0
+        self.equity = StratifiedMean(np.ones(len(self.strata)))    # Pot shares, a tie splitting the pot with the tied opponents
+        self.win = StratifiedMean(np.ones(len(self.strata)))
+
+        self.samples = self.ties = 0
+        self.elapsed = 0.0      # Seconds spent sampling
+
+    def deal(self, count: int):
+        '''(count, runout + 2 * opponents) array of random cards, the runout first then the opponent holdings,
+        and the (count,) array of the stratum of each row'''
+        deck, rows = self.deck[:count], self.rows[:count]
+        strata = (self.next_stratum + rows) % len(self.strata)
+        self.next_stratum = (self.next_stratum + count) % len(self.strata)
+        for column in range(self.runout + 2 * self.opponents):
+            if column < self.strata.shape[1]:
+                swap = np.argmax(deck == self.strata[strata, column, None], axis=1)
+            else:
+                swap = self.rng.integers(column, deck.shape[1], size=count)
+            card = deck[:, column].copy()
+            deck[:, column] = deck[rows, swap]
+            deck[rows, swap] = card
+        return deck[:, :self.runout + 2 * self.opponents], strata
+
+    def sample(self, count: int):
+        '''Simulates count deals. Returns the pot share of each, 1 for a win and 1/n for a pot split n ways.'''
+        dealt, strata = self.deal(count)
+        runout = dealt[:, :self.runout]
+
+        if self.runout:
+            p1_ranks = rank_array(runout, self.p1_state)
+        else:
+            p1_ranks = np.full(count, self.p1_state.rank(), dtype=np.int32)
+
+        best = np.zeros(count, dtype=np.int32)
+        tied = np.zeros(count, dtype=np.int64)
+        for opponent in range(self.opponents):
+            p2_ranks = rank_array(np.hstack([dealt[:, self.runout + 2 * opponent:self.runout + 2 * opponent + 2], runout]),
+                                  self.board_state)
+            best = np.maximum(best, p2_ranks)
+            tied += p2_ranks == p1_ranks
+
+        win = p1_ranks > best
+        tie = p1_ranks == best
+        self.samples += count
+        self.ties += int(np.count_nonzero(tie))
+
+        shares = win + tie / (tied + 1)
+        self.equity.add(strata, shares)
+        self.win.add(strata, win)
+        return shares
+
+    def run(self, samples: int):
+        '''Simulates samples more deals, batch by batch. Returns self.'''
+        while samples > 0:
+            count = min(samples, self.batch)
+            self.timed_sample(count)
+            samples -= count
+        return self
+
+    def timed_sample(self, count: int):
+        started = time.monotonic()
+        self.sample(count)
+        self.elapsed += time.monotonic() - started
+
+    def until(self, deadline: float=None, stderr: float=None, max_samples: int=None, thresholds=None,
+              confidence: float=CONFIDENCE, key: str='equity'):
+        '''Simulates deals batch by batch until the time.monotonic() deadline, until the standard errors of the win
+        probability and of the equity are at most stderr, until the confidence interval of result()[key] lies in a
+        single band between sorted thresholds, or until max_samples deals in all. Batches are cut short so as to end
+        before the deadline. Returns self.'''
+        assert deadline is not None or stderr is not None or max_samples is not None or thresholds is not None, \
+            'nothing would stop the sampling'
+        while max_samples is None or self.samples < max_samples:
+            result = self.result()
+            if self.samples >= MIN_SAMPLES:
+                if stderr is not None and max(result['stderr'], result['win_stderr']) <= stderr: break
+                if thresholds is not None and band(thresholds, *self.bounds(confidence, key)) is not None: break
+
+            count = self.batch if max_samples is None else min(self.batch, max_samples - self.samples)
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                # Probe the speed with a small batch first
+                count = min(count, int(left * self.samples / self.elapsed) if self.elapsed else MIN_SAMPLES)
+                if count < MIN_SAMPLES or left <= 0: break
+            self.timed_sample(count)
+        return self
+
+    def result(self, thresholds=None, confidence: float=CONFIDENCE, key: str='equity'):
+        '''Estimate so far: win and tie probabilities, equity (the average pot share), the standard errors of the
+        equity and of the win probability, the variance per sample of the equity, i.e. its squared standard error
+        times the number of samples, and the number of samples. With sorted thresholds, also the confidence 'bounds'
+        of result[key], its 'band' and the 'band_limits' of the band, both None while the bounds straddle a
+        threshold, see sampling.banded.'''
+        variance = self.equity.variance()
+        result = {'win': self.win.mean(), 'tie': self.ties / max(self.samples, 1), 'equity': self.equity.mean(),
+                  'stderr': variance ** 0.5, 'win_stderr': self.win.stderr(), 'variance': variance * self.samples,
+                  'samples': self.samples}
+        if thresholds is None: return result
+        result['bounds'] = self.bounds(confidence, key)
+        return banded(result, thresholds, key)
+
+    def bounds(self, confidence: float=CONFIDENCE, key: str='equity'):
+        '''Confidence interval of the equity or the win probability'''
+        estimate = self.equity if key == 'equity' else self.win
+        return confidence_bounds(estimate.mean(), estimate.stderr(), confidence)
+
+
+def equity(hand, board, opponents: int, samples: int, seed=None, stratified: bool=False):
+    '''Estimate of a hand against opponents random holdings after samples deals, see MonteCarlo.result'''
+    return MonteCarlo(hand, board, opponents, min(samples, DEFAULT_BATCH), seed, stratified).run(samples).result()
+
+def anytime_equity(hand, board, opponents: int, deadline: float=None, stderr: float=None, max_samples: int=None,
+                   seed=None, stratified: bool=False):
+    '''Estimate of a hand against opponents random holdings when the time.monotonic() deadline passes, or once its
+    standard errors are at most stderr, see MonteCarlo.until'''
+    return MonteCarlo(hand, board, opponents, seed=seed, stratified=stratified).until(deadline, stderr, max_samples).result()
+
+def banded_equity(hand, board, opponents: int, thresholds, confidence: float=CONFIDENCE, key: str='equity',
+                  deadline: float=None, max_samples: int=None, seed=None, stratified: bool=True):
+    '''Estimate of a hand against opponents random holdings once the confidence interval of its equity, or of its win
+    probability with key='win', lies in a single band between sorted thresholds, see MonteCarlo.until. The result
+    holds the band, None if the deadline or max_samples came first, see MonteCarlo.result.'''
+    simulation = MonteCarlo(hand, board, opponents, seed=seed, stratified=stratified)
+    return simulation.until(deadline, None, max_samples, thresholds, confidence, key).result(thresholds, confidence, key)
+
+def stored_equity(hand, board, opponents: int, deadline: float=None, stderr: float=None, max_samples: int=None,
+                  stratified: bool=False):
+    '''anytime_equity, answered from the equity store instead when it holds an estimate of the spot whose standard
+    errors are at most stderr. A new estimate replaces the stored one if it is more precise.'''
+    store = equity_store.store()
+    stored = store.get('montecarlo', hand, board, opponents)
+    precision = lambda result: max(result['stderr'], result['win_stderr'])
+    if stored is not None and stderr is not None and precision(stored) <= stderr:
+        return stored
+
+    result = anytime_equity(hand, board, opponents, deadline, stderr, max_samples, stratified=stratified)
+    if stored is None or precision(result) < precision(stored):
+        store.put('montecarlo', hand, board, opponents, result)
+    return result
+
+
+if __name__ == "__main__":
+    from evaluator import card_ids
+    from batch_eval import hand_strength_counts
+
+    result = equity(card_ids(['As', 'Ah']), [], 1, 200000, seed=0)
+    assert abs(result['equity'] - 0.852) < 0.005 and result['samples'] == 200000
+    assert abs(result['win'] + result['tie'] / 2 - result['equity']) < 1e-12
+
+    # Against one opponent on the river, the estimate converges to the exact counts
+    hand, board = card_ids(['7h', '9h']), card_ids(['8h', '6c', '4h', 'Kd', '2s'])
+    win, tie, loss = hand_strength_counts(hand, board)
+    result = equity(hand, board, 1, 100000, seed=1)
+    assert abs(result['win'] - win / (win + tie + loss)) < 0.01
+
+    three_way = equity(card_ids(['Ks', 'Qs']), card_ids(['Js', 'Td', '2c']), 3, 50000, seed=2)
+    assert 0 < three_way['win'] < three_way['equity'] < 1
+
+    simulation = MonteCarlo(card_ids(['2c', '2d']), [], 9, batch=1000, seed=3)
+    assert simulation.run(2500).result()['samples'] == 2500
+    assert all(sorted(row) == sorted(set(row)) for row in simulation.deal(1000)[0].tolist())
+
+    started = time.monotonic()
+    result = anytime_equity(card_ids(['Ks', 'Qs']), card_ids(['Js', 'Td', '2c']), 3, deadline=started + 0.05, seed=4)
+    assert time.monotonic() - started < 0.1 and result['samples'] >= MIN_SAMPLES
+    result = anytime_equity(card_ids(['Ks', 'Qs']), card_ids(['Js', 'Td', '2c']), 3, stderr=0.005, seed=5)
+    assert max(result['stderr'], result['win_stderr']) <= 0.005 and abs(result['equity'] - three_way['equity']) < 0.02
+    assert anytime_equity(card_ids(['Ks', 'Qs']), [], 2, max_samples=3000)['samples'] == 3000
+
+    hand, board = card_ids(['Ah', 'Qh']), card_ids(['Jh', '7h', '2c'])
+    plain = equity(hand, board, 2, 60000, seed=6)
+    stratified = equity(hand, board, 2, 60000, seed=6, stratified=True)
+    assert abs(plain['equity'] - stratified['equity']) < 3 * plain['stderr']
+    assert stratified['variance'] < plain['variance']
+
+    # A clear-cut spot is banded in a few batches, a close one takes until max_samples
+    clear = banded_equity(card_ids(['As', 'Ah']), card_ids(['Ad', 'Tc', '3c']), 2, [0.25, 0.45, 0.65, 0.75], seed=7)
+    assert clear['band'] == 4 and clear['band_limits'] == (0.75, 1.0) and clear['samples'] <= 2 * DEFAULT_BATCH
+    assert clear['bounds'][0] >= 0.75 and clear['bounds'][0] <= clear['equity'] <= clear['bounds'][1]
+    close = banded_equity(card_ids(['As', 'Ah']), [], 1, [0.852], max_samples=50000, seed=8)
+    assert close['samples'] == 50000 and close['bounds'][0] < 0.852 < close['bounds'][1] and close['band'] is None
+    win = banded_equity(card_ids(['7c', '2d']), card_ids(['Ah', 'Kh', 'Qs']), 3, [0.25], key='win', seed=9)
+    assert win['band'] == 0 and win['bounds'][1] < 0.25
+
+    print('All tests passed.')
@@ -0,0 +1,71 @@
+'''Preflop equity tables: for each of the 169 starting hand classes of hand_index and 1 to MAX_OPPONENTS random
+opponents, the probability that the hand wins the pot outright and its equity, the share of the pot it wins on
+average with split pots shared among the tied players.
+
+The tables are a small (2, 169, MAX_OPPONENTS) float32 .npy file, loaded whole on first use. Build it with
+build_preflop.py. Every lookup returns None when there is no table.'''
+import os
+
+import numpy as np
+
+from hand_index import hand_index, hand_unindex
+
+PREFLOP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_equity.npy')
+CLASSES = 169
+MAX_OPPONENTS = 9
+WIN, EQUITY = 0, 1
+
+_table = None
+
+
+def table():
+    '''Returns the (2, 169, MAX_OPPONENTS) table, or None if there is none'''
+    global _table
+    if _table is None:
+        _table = np.load(PREFLOP_PATH) if os.path.exists(PREFLOP_PATH) else False
+    return _table if _table is not False else None
+
+def lookup(hand, opponents: int, column: int=EQUITY):
+    '''WIN or EQUITY of hole cards, a list of 2 card ids, against a number of random opponents'''
+    t = table()
+    if t is None: return None
+    assert 1 <= opponents <= MAX_OPPONENTS, f'opponents must be between 1 and {MAX_OPPONENTS}'
+    return float(t[column, hand_index(list(hand)), opponents - 1])
+
+def equity(hand, opponents: int):
+    return lookup(hand, opponents, EQUITY)
+
+def win_prob(hand, opponents: int):
+    return lookup(hand, opponents, WIN)
+
+def chart(opponents: int, column: int=EQUITY):
+    '''13x13 chart of a column in the layout of the bots' income_rates: chart[high - 2][low - 2] for suited hands,
+    chart[low - 2][high - 2] for the others, Two = 2 to Ace = 14'''
+    t = table()
+    if t is None: return None
+
+    chart = [[0.0] * 13 for _ in range(13)]
+    for index in range(CLASSES):
+        first, second = hand_unindex(0, index)
+        high, low = max(first % 13, second % 13), min(first % 13, second % 13)
+        row, col = (high, low) if first // 13 == second // 13 else (low, high)
+        chart[row][col] = float(t[column, index, opponents - 1])
+    return chart
+
+
+if __name__ == "__main__":
+    from evaluator import card_ids
+
+    if table() is None:
+        raise SystemExit(f'No table at {PREFLOP_PATH}, run build_preflop.py')
+
+    assert table().shape == (2, CLASSES, MAX_OPPONENTS)
+    assert equity(card_ids(['As', 'Ah']), 1) == equity(card_ids(['Ad', 'Ac']), 1)
+    assert 0.84 < equity(card_ids(['As', 'Ah']), 1) < 0.86
+    assert 0.34 < equity(card_ids(['7c', '2d']), 1) < 0.35
+    assert win_prob(card_ids(['Ks', 'Qs']), 1) < equity(card_ids(['Ks', 'Qs']), 1)
+    assert all(equity(card_ids(['As', 'Ah']), opponents) > equity(card_ids(['As', 'Ah']), opponents + 1)
+               for opponents in range(1, MAX_OPPONENTS))
+    assert chart(1)[12][11] == equity(card_ids(['Ah', 'Kh']), 1) and chart(1)[11][12] == equity(card_ids(['Ah', 'Kd']), 1)
+
+    print('All tests passed.')
@@ -0,0 +1,95 @@
+'''Process-wide LRU cache of hand ranks.
+
+Hands are keyed by a canonical integer: when no suit holds 5 cards the rank only depends on the rank multiset,
+so the key is the negated quinary rank key and all suit permutations share one entry. With a flush, only the
+13-bit rank mask of the flush suit matters, and that mask is the key. The two kinds of keys never collide.'''
+from collections import OrderedDict
+
+from evaluator import EvalState, FLUSH_BITS, FLUSH_CHECK, SUIT_MASK, QUINARY, SUIT_COUNT, BIT
+
+ENTRY_BYTES = 168                   # Measured size of one OrderedDict entry with int key and value
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def canonical_key(key: int, suits: int, mask: int):
+    '''Canonical integer of a hand given its quinary key, suit counts and card mask (the fields of an EvalState)'''
+    flush = (suits + FLUSH_CHECK) & FLUSH_BITS
+    if flush:
+        return (mask >> (13 * (flush.bit_length() // 4 - 1))) & SUIT_MASK
+    return -key
+
+
+class RankCache():
+    '''Bounded LRU map from canonical keys to ranks, with hit, miss and eviction counters'''
+    def __init__(self, max_bytes: int=DEFAULT_MAX_BYTES):
+        self.ranks = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        self.resize(max_bytes)
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def resize(self, max_bytes: int):
+        '''Sets the memory bound, evicting the least recently used entries if needed'''
+        self.max_bytes = max_bytes
+        self.max_entries = max(1, max_bytes // ENTRY_BYTES)
+        while len(self.ranks) > self.max_entries:
+            self.ranks.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.ranks.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.ranks),
+                'max_entries': self.max_entries, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def rank(self, state: EvalState):
+        '''Rank of the cards of the state, which must hold 5 to 7 cards'''
+        return self.rank_with(state)
+
+    def rank_with(self, state: EvalState, *cards):
+        '''Same as state.rank_with(*cards), looked up in the cache first'''
+        key, suits, mask = state.key, state.suits, state.mask
+        for card in cards:
+            key += QUINARY[card]
+            suits += SUIT_COUNT[card]
+            mask |= BIT[card]
+
+        canonical = canonical_key(key, suits, mask)
+        ranks = self.ranks
+        rank = ranks.get(canonical)
+        if rank is not None:
+            self.hits += 1
+            ranks.move_to_end(canonical)
+            return rank
+
+        self.misses += 1
+        rank = state.rank_with(*cards)
+        ranks[canonical] = rank
+        if len(ranks) > self.max_entries:
+            ranks.popitem(last=False)
+            self.evictions += 1
+        return rank
+
+
+cache = RankCache()
+
+
+if __name__ == "__main__":
+    from evaluator import card_ids, rank
+
+    small = RankCache(ENTRY_BYTES * 2)
+    spades = EvalState(card_ids(['As', 'Ks', 'Qs', 'Js']))
+    assert small.rank_with(spades, card_ids(['Ts'])[0]) == rank(card_ids(['As', 'Ks', 'Qs', 'Js', 'Ts']))
+    assert small.rank(EvalState(card_ids(['Ah', 'Kh', 'Qh', 'Jh', 'Th']))) == small.rank_with(spades, card_ids(['Ts'])[0])
+    assert small.stats()['hits'] == 2 and small.stats()['misses'] == 1
+
+    small.rank(EvalState(card_ids(['Ah', 'Kd', 'Qh', 'Jh', 'Th'])))
+    assert small.rank(EvalState(card_ids(['As', 'Kc', 'Qs', 'Jd', 'Th']))) == rank(card_ids(['Ah', 'Kd', 'Qh', 'Jh', 'Th']))
+    small.rank(EvalState(card_ids(['2h', '2d', '2s', '5h', '8c'])))
+    assert len(small) == 2 and small.evictions == 1
+
+    print('All tests passed.')
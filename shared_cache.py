@@ -0,0 +1,119 @@
+'''Rank cache in shared memory, readable and writable by every worker of worker_pool without locks.
+
+The cache is a fixed-size open-addressed table of 64-bit words. A word holds the canonical key of a hand plus one
+(see rank_cache.canonical_key, mapped to a non-negative int) in its high bits and the rank in its low 16 bits, and 0
+when the slot is empty. Since a slot is read and written as a single aligned word, a reader sees either a whole entry
+or none, and checks the key before using the rank. Two writers racing for a slot only lose one entry, never corrupt
+one. A key is looked for in PROBES slots after its hash; when they are all taken, the first one is overwritten.'''
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import evaluator
+import batch_eval
+from batch_eval import QUINARY, SUIT_COUNT, BIT
+
+PROBES = 4
+DEFAULT_SLOTS = 1 << 20         # 8 MB
+FLUSH_KEYS = 1 << 13            # Flush keys are 13-bit rank masks, the others are offset by this
+HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+class SharedRankCache():
+    '''Shared-memory rank cache. Create it in the parent process, and attach to it by name in the workers.'''
+    def __init__(self, slots: int=DEFAULT_SLOTS, name: str=None):
+        if name is None:
+            assert slots & (slots - 1) == 0, 'slots must be a power of 2'
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * 8)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+        self.table = np.ndarray((self.memory.size // 8,), dtype=np.uint64, buffer=self.memory.buf)
+        if self.owner: self.table[:] = 0
+        self.shift = np.uint64(64 - (len(self.table).bit_length() - 1))
+        self.hits = self.misses = 0
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def close(self):
+        '''Detaches from the shared memory, and frees it if this process created it'''
+        self.table = None
+        self.memory.close()
+        if self.owner: self.memory.unlink()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'used': int(np.count_nonzero(self.table)),
+                'slots': len(self.table), 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def keys(self, cards, state: evaluator.EvalState):
+        '''Canonical keys of an (N, k) array of card ids plus the cards of state, as uint64, see rank_cache.canonical_key'''
+        key = QUINARY[cards].sum(axis=1) + state.key
+        suits = SUIT_COUNT[cards].sum(axis=1) + state.suits
+
+        flush = (suits + evaluator.FLUSH_CHECK) & evaluator.FLUSH_BITS
+        keys = key + FLUSH_KEYS
+        rows = np.flatnonzero(flush)
+        if rows.size:
+            suit = (np.log2(flush[rows]).astype(np.int64) - 3) // 4
+            keys[rows] = ((BIT[cards[rows]].sum(axis=1) | state.mask) >> (13 * suit)) & evaluator.SUIT_MASK
+        return keys.astype(np.uint64)
+
+    def rank_array(self, cards, state: evaluator.EvalState=None):
+        '''Same as batch_eval.rank_array, looking the hands up in the cache first and storing the ones that missed'''
+        cards = np.asarray(cards)
+        if state is None: state = evaluator.EvalState()
+
+        tags = self.keys(cards, state) + np.uint64(1)
+        home = (tags * HASH) >> self.shift
+        last = np.uint64(len(self.table) - 1)
+
+        ranks = np.zeros(len(cards), dtype=np.int32)
+        found = np.zeros(len(cards), dtype=bool)
+        for probe in range(PROBES):
+            entries = self.table[(home + np.uint64(probe)) & last]
+            hit = ~found & ((entries >> np.uint64(16)) == tags)
+            ranks[hit] = (entries[hit] & np.uint64(0xFFFF)).astype(np.int32)
+            found |= hit
+
+        rows = np.flatnonzero(~found)
+        self.hits += len(cards) - rows.size
+        self.misses += rows.size
+        if rows.size:
+            ranks[rows] = batch_eval.rank_array(cards[rows], state)
+            self.store(home[rows], tags[rows], ranks[rows])
+        return ranks
+
+    def store(self, home, tags, ranks):
+        '''Writes entries in the first empty slot after their hash, or over the first one if none is empty'''
+        last = np.uint64(len(self.table) - 1)
+        slots = home.copy()
+        placed = np.zeros(len(home), dtype=bool)
+        for probe in range(PROBES):
+            slot = (home + np.uint64(probe)) & last
+            empty = ~placed & (self.table[slot] == 0)
+            slots[empty] = slot[empty]
+            placed |= empty
+        self.table[slots] = (tags << np.uint64(16)) | ranks.astype(np.uint64)
+
+
+if __name__ == "__main__":
+    cache = SharedRankCache(1 << 12)
+    worker = SharedRankCache(name=cache.name)
+
+    rng = np.random.default_rng()
+    hands = np.argsort(rng.random((5000, 52)), axis=1)[:, :7]
+    expected = batch_eval.rank_array(hands)
+
+    assert (cache.rank_array(hands) == expected).all()
+    assert (worker.rank_array(hands) == expected).all() and worker.hits > 0
+    board = evaluator.EvalState(hands[0, :3].tolist())
+    assert (worker.rank_array(hands[:1, 3:], board) == expected[:1]).all()
+
+    worker.close()
+    cache.close()
+    print('All tests passed.')
@@ -0,0 +1,76 @@
+'''Long-lived process pool for the equity computations.
+
+The pool is created on first use and kept for the life of the bot process, so its startup is paid once instead of
+on every decision. Each worker loads the rank tables when it starts. Work is sent in a few chunks per worker, with
+the data shared by all the items of a call sent once per chunk. The workers and the parent process share one
+shared_cache.SharedRankCache. The pool is closed and the cache freed when the process exits.'''
+import atexit
+from multiprocessing import Pool, cpu_count
+
+import batch_eval
+from shared_cache import SharedRankCache
+
+WORKERS = cpu_count()
+CHUNKS_PER_WORKER = 4
+
+_pool = None
+_cache = None
+
+
+def _warm(cache_name: str):
+    '''Pool initializer: loads the rank tables in the worker and attaches to the shared rank cache'''
+    global _cache
+    batch_eval.tables()
+    _cache = SharedRankCache(name=cache_name)
+
+def pool():
+    '''Returns the process pool, starting it on first use'''
+    global _pool
+    if _pool is None:
+        _pool = Pool(WORKERS, initializer=_warm, initargs=(shared_cache().name,))
+        atexit.register(shutdown)
+    return _pool
+
+def shared_cache():
+    '''Returns the rank cache shared by the parent process and the workers, creating it in the parent on first use'''
+    global _cache
+    if _cache is None:
+        _cache = SharedRankCache()
+        atexit.register(shutdown)
+    return _cache
+
+def shutdown():
+    '''Closes the pool and waits for its workers, then frees the shared cache. Later calls start new ones.'''
+    global _pool, _cache
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+    atexit.unregister(shutdown)
+
+
+def chunks(items: list, count: int):
+    '''Splits items into at most count slices of nearly equal size'''
+    count = max(1, min(count, len(items)))
+    size, extra = divmod(len(items), count)
+    bounds = [idx * size + min(idx, extra) for idx in range(count + 1)]
+    return [items[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def map_chunks(func, context, items: list):
+    '''Calls func(context, chunk) in the workers for chunks of items and returns the results, in order.
+    func must be picklable, i.e. defined at the top level of a module or as a static method.'''
+    return pool().starmap(func, [(context, chunk) for chunk in chunks(items, WORKERS * CHUNKS_PER_WORKER)])
+
+
+if __name__ == "__main__":
+    assert chunks(list(range(10)), 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert chunks([1], 8) == [[1]]
+    from operator import mul
+    assert sum(map_chunks(mul, 1, list(range(100))), []) == list(range(100))
+    assert pool() is pool()
+    shutdown()
+
+    print('All tests passed.')